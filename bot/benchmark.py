@@ -0,0 +1,265 @@
+"""Benchmarks for the bot, run offline against the real assets.
+
+Run them from the root of the repository, for example `python bot/benchmark.py encoding`.
+"""
+
+import argparse
+import json
+import random
+import resource
+import statistics
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+from time import perf_counter
+from typing import TypeVar
+
+import map as game_map
+from database.database import PRAGMA_PROFILES, ConnectionPool, PlayerDetail, Score
+from encoders import encode
+from PIL import Image
+
+T = TypeVar("T")
+
+# Stages of rendering a frame, in the order they run, timed by the pipeline benchmark
+STAGES = ["decode", "crop", "composite", "text", "encode"]
+
+# Frame formats and settings compared by the encoding benchmark
+ENCODINGS = [
+    ("png", {"compress_level": 1}),
+    ("png", {"compress_level": 6}),
+    ("png", {"compress_level": 9}),
+    ("png-palette", {}),
+    ("webp", {"quality": 0}),
+    ("webp", {"quality": 80}),
+    ("webp-lossy", {"quality": 80}),
+    ("jpeg", {"quality": 85}),
+]
+
+
+def sample_frames(count: int, seed: int = 0) -> list[Image.Image]:
+    """Render frames for a random sample of map variants and tiles, the same sample for the same seed."""
+    rng = random.Random(seed)  # noqa: S311, not used for security
+    variants = [path.name for path in game_map.map_variant_paths()]
+    tiles = game_map.all_tiles()
+    return [
+        game_map.generate_map(rng.choice(tiles), map_name=rng.choice(variants), player_display_name="Maria")
+        for _ in range(count)
+    ]
+
+
+def benchmark_encoding(args: argparse.Namespace) -> None:
+    """Compare encode time and size of every frame format on real frames."""
+    frames = sample_frames(args.frames, args.seed)
+    print(f"Encoding {len(frames)} frames of {game_map.CAMERA_W}x{game_map.CAMERA_H} pixels\n")
+    print(f"{'format':<12} {'settings':<18} {'mean ms':>8} {'p95 ms':>8} {'mean KiB':>9}")
+    for format, settings in ENCODINGS:
+        durations = []
+        sizes = []
+        for frame in frames:
+            start = perf_counter()
+            sizes.append(len(encode(frame, format, **settings)))
+            durations.append(perf_counter() - start)
+        p95 = statistics.quantiles(durations, n=20)[-1] if len(durations) > 1 else durations[0]
+        described_settings = ", ".join(f"{name}={value}" for name, value in settings.items())
+        print(
+            f"{format:<12} {described_settings:<18} {statistics.mean(durations) * 1000:>8.1f} "
+            f"{p95 * 1000:>8.1f} {statistics.mean(sizes) / 1024:>9.1f}",
+        )
+
+
+def summarise(durations: list[float]) -> dict[str, float]:
+    """Return the mean and 95th percentile of the durations in milliseconds."""
+    p95 = statistics.quantiles(durations, n=20)[-1] if len(durations) > 1 else durations[0]
+    return {"mean_ms": statistics.mean(durations) * 1000, "p95_ms": p95 * 1000}
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return a description of every stage whose mean latency grew by more than threshold over the baseline."""
+    regressions = []
+    for stage, stats in results["stages"].items():
+        before = baseline["stages"].get(stage)
+        if before is not None and stats["mean_ms"] > before["mean_ms"] * (1 + threshold):
+            regressions.append(f"{stage}: {before['mean_ms']:.2f} ms -> {stats['mean_ms']:.2f} ms")
+    return regressions
+
+
+def benchmark_pipeline(args: argparse.Namespace) -> None:
+    """Time every stage of rendering a frame, for every map variant and a sample of tiles.
+
+    The asset and name box caches are cleared for every variant, so each variant includes one cold decode of the
+    map and one cold name box, like the first frame a player sees after unlocking a level. If the map is baked
+    into tiles, the decode only covers the tiles of the first camera box, and later crops decode the tiles they need.
+    The composite stage only times pasting the player on the crop, or reading the frame if it is in the map pack, in
+    which case the crop isn't used.
+    """
+    if args.no_pack:
+        game_map.map_pack = None
+    if args.no_tiles:
+        game_map.map_tiles = None
+    rng = random.Random(args.seed)  # noqa: S311, not used for security
+    tiles = game_map.all_tiles()
+    tiles = rng.sample(tiles, min(args.tiles, len(tiles)))
+    durations: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    sizes = []
+
+    def timed(stage: str, function: Callable[[], T]) -> T:
+        start = perf_counter()
+        result = function()
+        durations[stage].append(perf_counter() - start)
+        return result
+
+    for map_path in game_map.map_variant_paths():
+        map_name = map_path.name
+        game_map.asset_cache.clear()
+        game_map.label_cache.clear()
+        if game_map.map_tiles is None:
+            timed("decode", lambda: game_map.load_map(map_name))  # noqa: B023, called right away
+        else:
+            timed("decode", lambda: game_map._crop_map(tiles[0], map_name=map_name))  # noqa: B023, SLF001
+        for position in tiles:
+            crop = timed("crop", lambda: game_map.crop_for_player(position, map_name=map_name))  # noqa: B023
+            if game_map.map_pack is not None and game_map.map_pack.locate(map_name, position) is not None:
+                bg, player_h = timed("composite", lambda: game_map.draw_player(position, map_name=map_name))  # noqa: B023
+            else:
+                bg, player_h = timed("composite", lambda: game_map.paste_player(crop))  # noqa: B023
+            timed("text", lambda: game_map.draw_name_box(bg, "Maria", player_h))  # noqa: B023
+            sizes.append(len(timed("encode", lambda: game_map.encode_image(bg))))  # noqa: B023
+
+    results = {
+        "frames": len(sizes),
+        "stages": {stage: summarise(stage_durations) for stage, stage_durations in durations.items()},
+        "mean_frame_bytes": statistics.mean(sizes),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    print(
+        f"Rendered {results['frames']} frames, {'with' if game_map.map_pack else 'without'} a map pack "
+        f"and {'with' if game_map.map_tiles else 'without'} map tiles\n",
+    )
+    print(f"{'stage':<10} {'mean ms':>8} {'p95 ms':>8}")
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<10} {stats['mean_ms']:>8.2f} {stats['p95_ms']:>8.2f}")
+    print(f"\nMean frame size: {results['mean_frame_bytes'] / 1024:.1f} KiB")
+    print(f"Peak memory: {results['peak_rss_mib']:.0f} MiB")
+
+    if args.save:
+        with Path.open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Saved the results to {args.save}")
+    if args.compare:
+        with Path.open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nStages more than {args.threshold:.0%} slower than {args.compare}:")
+            print("\n".join(regressions))
+            raise SystemExit(1)
+        print(f"\nNo stage is more than {args.threshold:.0%} slower than {args.compare}")
+
+
+# Share of every kind of database operation in the traffic replayed by the database benchmark, like a busy server
+# where most saves are moves on the map
+DATABASE_TRAFFIC = {"move": 0.7, "play": 0.05, "player": 0.2, "scores": 0.05}
+DATABASE_WRITES = ["move", "play"]
+
+
+def database_traffic(count: int, players: int, seed: int) -> list[tuple[str, tuple]]:
+    """Return random database operations with their arguments, the same operations for the same seed."""
+    rng = random.Random(seed)  # noqa: S311, not used for security
+    kinds = rng.choices(list(DATABASE_TRAFFIC), weights=list(DATABASE_TRAFFIC.values()), k=count)
+    operations = []
+    for kind in kinds:
+        username = f"player{rng.randrange(players)}"
+        level = rng.randint(1, 11)
+        if kind == "move":
+            operations.append((kind, (username, rng.randrange(7), rng.randrange(5))))
+        elif kind == "play":
+            play = {"username": username, "level": level, "score": rng.randrange(1000), "completed": True}
+            operations.append((kind, ((play,),)))
+        elif kind == "player":
+            operations.append((kind, (username,)))
+        else:
+            operations.append((kind, (level,)))
+    return operations
+
+
+def benchmark_database(args: argparse.Namespace) -> None:
+    """Compare the write and read throughput of the SQLite pragma profiles on replayed player traffic.
+
+    Every profile starts from a new database file with the same history of plays, and replays the same operations:
+    moves, which save a map position with update_map_coordinates, completed levels, which insert a play with
+    insert_many, and loads of players and score sheets. Operations run one at a time, like in the database thread.
+    """
+    history = [
+        {"username": f"player{player}", "level": level, "score": score, "completed": True}
+        for player in range(args.players)
+        for level, score in zip(range(1, 12), range(100, 1200, 100), strict=True)
+    ]
+    traffic = database_traffic(args.operations, args.players, args.seed)
+    print(f"Replaying {len(traffic)} operations of {args.players} players on {len(history)} plays\n")
+    print(f"{'profile':<10} {'writes/s':>9} {'write p95 ms':>13} {'reads/s':>9} {'read p95 ms':>12}")
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as directory:
+            pool = ConnectionPool(Path(directory, "benchmark.db"), max_size=1, pragmas=PRAGMA_PROFILES[profile])
+            players, scores = PlayerDetail(pool=pool), Score(pool=pool)
+            players.insert_many(tuple(history))
+            run = {
+                "move": players.update_map_coordinates,
+                "play": players.insert_many,
+                "player": players.get,
+                "scores": scores.fetch,
+            }
+            writes, reads = [], []
+            for kind, arguments in traffic:
+                start = perf_counter()
+                run[kind](*arguments)
+                (writes if kind in DATABASE_WRITES else reads).append(perf_counter() - start)
+            pool.close()
+        write_stats, read_stats = summarise(writes), summarise(reads)
+        print(
+            f"{profile:<10} {len(writes) / sum(writes):>9.0f} {write_stats['p95_ms']:>13.2f} "
+            f"{len(reads) / sum(reads):>9.0f} {read_stats['p95_ms']:>12.2f}",
+        )
+
+
+def main() -> None:
+    """Run the benchmark chosen on the command line."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    benchmarks = parser.add_subparsers(required=True, metavar="benchmark")
+
+    encoding = benchmarks.add_parser("encoding", help="compare encode time and size of the frame formats")
+    encoding.add_argument("--frames", type=int, default=30, help="number of frames to encode")
+    encoding.add_argument("--seed", type=int, default=0, help="seed for picking the frames")
+    encoding.set_defaults(run=benchmark_encoding)
+
+    pipeline = benchmarks.add_parser("pipeline", help="time every stage of rendering a frame")
+    pipeline.add_argument("--tiles", type=int, default=10, help="number of tiles to render for every map variant")
+    pipeline.add_argument("--seed", type=int, default=0, help="seed for picking the tiles")
+    pipeline.add_argument("--no-pack", action="store_true", help="compose frames even if there is a map pack")
+    pipeline.add_argument("--no-tiles", action="store_true", help="decode whole maps even if there are map tiles")
+    pipeline.add_argument("--save", type=Path, help="write the results to this JSON file, to use as a baseline")
+    pipeline.add_argument("--compare", type=Path, help="fail if a stage is slower than in this baseline")
+    pipeline.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown over the baseline")
+    pipeline.set_defaults(run=benchmark_pipeline)
+
+    database = benchmarks.add_parser("database", help="compare the throughput of the SQLite pragma profiles")
+    database.add_argument("--operations", type=int, default=5000, help="number of operations to replay")
+    database.add_argument("--players", type=int, default=200, help="number of players in the database")
+    database.add_argument("--seed", type=int, default=0, help="seed for generating the operations")
+    database.add_argument(
+        "--profiles",
+        nargs="+",
+        choices=list(PRAGMA_PROFILES),
+        default=list(PRAGMA_PROFILES),
+        help="profiles to compare, all of them by default",
+    )
+    database.set_defaults(run=benchmark_database)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
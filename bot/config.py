@@ -1,4 +1,10 @@
 from enum import Enum
+from os import getenv
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
 
 
 class Emoji(Enum):
@@ -17,3 +23,67 @@ class Emoji(Enum):
     LETTER_D = "<:letter_d:1265996409040277595>"
     LETTER_E = "<:letter_e:1265996410453622945>"
     LETTER_F = "<:letter_f:1265996412601241663>"
+
+
+# Memory budget in bytes for decoded map variants and sprites. A decoded map variant is about 15 MB.
+ASSET_CACHE_BYTES = int(getenv("ASSET_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+# Memory budget in bytes for name boxes with a player's name drawn in them. A name box is about 40 kB.
+LABEL_CACHE_BYTES = int(getenv("LABEL_CACHE_BYTES", str(16 * 1024 * 1024)))
+
+# How map frames are encoded: "png", "png-palette", "webp", "webp-lossy" or "jpeg". See encoders.encode.
+# Compare the formats on real frames with `python bot/benchmark.py encoding`.
+FRAME_FORMAT = getenv("FRAME_FORMAT", "png")
+FRAME_COMPRESS_LEVEL = int(getenv("FRAME_COMPRESS_LEVEL", "6"))  # zlib level of PNG frames, 0-9
+FRAME_QUALITY = int(getenv("FRAME_QUALITY", "80"))  # Quality of lossy frames, or compression effort of lossless WebP
+
+# Memory budget in bytes and lifetime in seconds for encoded map frames, which are reused when a player revisits a tile
+FRAME_CACHE_BYTES = int(getenv("FRAME_CACHE_BYTES", str(64 * 1024 * 1024)))
+FRAME_CACHE_TTL = float(getenv("FRAME_CACHE_TTL", "900"))
+
+# Renders run in a pool of worker processes ("process") or threads ("thread"), so they don't block the event loop.
+# At most RENDER_QUEUE_SIZE renders are handed to the pool at once, the rest wait for a free slot.
+# Worker processes each have their own asset cache, so ASSET_CACHE_BYTES is split between them.
+RENDER_POOL = getenv("RENDER_POOL", "process")
+RENDER_WORKERS = int(getenv("RENDER_WORKERS", "2"))
+RENDER_QUEUE_SIZE = int(getenv("RENDER_QUEUE_SIZE", "32"))
+
+# Frames are rendered smaller and compressed with less effort while more than RENDER_DOWNGRADE_PENDING renders are
+# pending, or while the 95th percentile render latency is above RENDER_DOWNGRADE_P95 seconds
+RENDER_DOWNGRADE_PENDING = int(getenv("RENDER_DOWNGRADE_PENDING", "16"))
+RENDER_DOWNGRADE_P95 = float(getenv("RENDER_DOWNGRADE_P95", "1"))
+
+# Unix socket of the render server started with `python bot/renderserver.py`, which renders the frames of every bot
+# process on the host. Frames are rendered in this process if it isn't set, or if the server doesn't answer in time.
+RENDER_SERVER_SOCKET = Path(socket) if (socket := getenv("RENDER_SERVER_SOCKET")) else None
+RENDER_SERVER_TIMEOUT = float(getenv("RENDER_SERVER_TIMEOUT", "5"))
+
+# Frames of the tiles next to a player are rendered in the background, at most this many at once. 0 turns it off.
+PREFETCH_CONCURRENCY = int(getenv("PREFETCH_CONCURRENCY", "2"))
+
+# Pack of pre-rendered map frames, baked with `python bot/mappack.py`. It is used if it exists and is up to date.
+MAP_PACK_PATH = Path(getenv("MAP_PACK_PATH", "bot/assets/map.pack"))
+
+# Map variants cut into tiles, baked with `python bot/maptiles.py`. Used if it exists and is up to date, so a render
+# only decodes the tiles the camera shows instead of the whole map.
+MAP_TILES_PATH = Path(getenv("MAP_TILES_PATH", "bot/assets/map.tiles"))
+
+# Pragmas that database connections are opened with: "default", "durable", "balanced" or "fast".
+# See database.database.PRAGMA_PROFILES, and `python bot/benchmark.py database` to compare them.
+DATABASE_PROFILE = getenv("DATABASE_PROFILE", "balanced")
+
+# Most connections to the database that are open at once, shared by everything in the process
+DATABASE_POOL_SIZE = int(getenv("DATABASE_POOL_SIZE", "4"))
+
+# Queries of coroutines run one at a time in the database thread. At most DATABASE_QUEUE_SIZE are handed to it at
+# once, the rest wait on the event loop.
+DATABASE_QUEUE_SIZE = int(getenv("DATABASE_QUEUE_SIZE", "64"))
+
+# Map positions are written to the database in one batch at most POSITION_FLUSH_INTERVAL seconds after the first
+# unsaved move, and when the bot stops. A crash loses at most this many seconds of movement.
+POSITION_FLUSH_INTERVAL = float(getenv("POSITION_FLUSH_INTERVAL", "10"))
+
+# Players that are kept loaded, so that every view and level of a player shares one Player. They are dropped when
+# more than PLAYER_CACHE_SIZE are loaded, or after PLAYER_CACHE_IDLE seconds of not being used.
+PLAYER_CACHE_SIZE = int(getenv("PLAYER_CACHE_SIZE", "1000"))
+PLAYER_CACHE_IDLE = float(getenv("PLAYER_CACHE_IDLE", "900"))
@@ -1,69 +1,272 @@
 from __future__ import annotations
 
 import sqlite3
-from contextlib import closing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
 from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from config import DATABASE_POOL_SIZE, DATABASE_PROFILE, DATABASE_QUEUE_SIZE
+from utils.executor import BoundedExecutor
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from contextlib import AbstractContextManager
 
 PATH = Path(__file__).parent  # Path of the database
 
-SCHEMA = """
-    CREATE TABLE IF NOT EXISTS player_detail(
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT NON NULL,
-        level INTEGER NON NULL DEFAULT 1,
-        score INTEGER NON NULL DEFAULT 0,
-        completed BOOLEAN NON NULL DEFAULT 1
-    );
-
-    CREATE TABLE IF NOT EXISTS map(
-        username TEXT PRIMARY KEY,
-        coord_x INTEGER NON NULL,
-        coord_y INTEGER NON NULL
-    );
-"""
+# Migrations of the schema, in the order they are applied. Each one is a list of statements, and the version of a
+# database is the number of migrations it has, as recorded in the schema_version table. Migrations that have been
+# released must never change, add a new one instead.
+MIGRATIONS = [
+    # 1: Tables of the game
+    [
+        """
+        CREATE TABLE IF NOT EXISTS player_detail(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NON NULL,
+            level INTEGER NON NULL DEFAULT 1,
+            score INTEGER NON NULL DEFAULT 0,
+            completed BOOLEAN NON NULL DEFAULT 1
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS map(
+            username TEXT PRIMARY KEY,
+            coord_x INTEGER NON NULL,
+            coord_y INTEGER NON NULL
+        )
+        """,
+    ],
+    # 2: Indexes for the plays of a player, in PlayerDetail.get, and the score sheet of a level, in Score.fetch
+    [
+        "CREATE INDEX IF NOT EXISTS player_detail_username_level ON player_detail(username, level)",
+        "CREATE INDEX IF NOT EXISTS player_detail_level_score ON player_detail(level, score)",
+    ],
+    # 3: Progress of every player, summarising their plays in player_detail, see models.player.Progress. Players
+    # from before this migration get theirs the next time they are loaded.
+    [
+        """
+        CREATE TABLE IF NOT EXISTS player_progress(
+            username TEXT PRIMARY KEY,
+            completed INTEGER NOT NULL DEFAULT 0,
+            unlocked INTEGER NOT NULL DEFAULT 0,
+            next_level INTEGER NOT NULL DEFAULT 1,
+            best_scores TEXT NOT NULL DEFAULT '{}'
+        )
+        """,
+    ],
+]
+
+
+def migrate(connection: sqlite3.Connection) -> int:
+    """Apply the migrations that the database doesn't have yet, and return its version.
+
+    The migrations are applied in one transaction, which other connections wait for, even those of other processes.
+    Databases from before versioning have no schema_version table, and are migrated from the start.
+    """
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version(
+            version INTEGER PRIMARY KEY,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    )
+    connection.commit()
+    with connection:  # Commits the migrations, or rolls all of them back if one fails
+        connection.execute("BEGIN IMMEDIATE")  # Read the version under the lock, so no migration is applied twice
+        (current,) = connection.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()
+        for version, migration in enumerate(MIGRATIONS[current:], start=current + 1):
+            for statement in migration:
+                connection.execute(statement)
+            connection.execute("INSERT INTO schema_version(version) VALUES (?)", (version,))
+    return max(current, len(MIGRATIONS))
+
+
+# Pragmas that connections are opened with, by profile, from the most durable to the fastest. WAL lets reads run
+# alongside a write, and commits append to the log instead of rewriting pages. With synchronous=NORMAL, a power
+# loss can undo the last commits, but never corrupt the database, and with OFF, so can a crash of the OS.
+# See https://www.sqlite.org/pragma.html
+PRAGMA_PROFILES: dict[str, dict[str, str | int]] = {
+    "default": {},  # Rollback journal, synchronous=FULL and a 2 MiB page cache
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16384,  # Negative sizes are in KiB
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 64 * 2**20,
+        "cache_size": -16384,
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    },
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "mmap_size": 256 * 2**20,
+        "cache_size": -65536,
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    },
+}
 
 sqlite3.register_adapter(bool, int)
 sqlite3.register_converter("BOOLEAN", lambda v: bool(int(v)))
 
 
+class PoolStats(NamedTuple):
+    """Snapshot of the usage of a connection pool."""
+
+    opened: int  # Connections opened since the pool was created
+    reused: int  # Times an idle connection was handed out again instead of opening a new one
+    open: int  # Connections that are open now, idle or in use
+    max_size: int
+
+
+class ConnectionPool:
+    """Connections to one SQLite database, shared by all repositories of the process.
+
+    Every connection is opened with the pragmas, those of the DATABASE_PROFILE profile by default, and the schema is
+    migrated once, on the first connection. At most max_size connections are open at once, and when
+    all of them are in use, borrowing one waits until another is returned. Since every connection to ":memory:"
+    is a database of its own, an in-memory pool, like the ones tests use, must have a max_size of 1.
+    """
+
+    def __init__(
+        self,
+        name: str | Path,
+        max_size: int = DATABASE_POOL_SIZE,
+        pragmas: dict[str, str | int] | None = None,
+    ) -> None:
+        if str(name) == ":memory:" and max_size != 1:
+            error = "An in-memory database can only have one connection"
+            raise ValueError(error)
+        self.name = name
+        self.max_size = max_size
+        self.pragmas = PRAGMA_PROFILES[DATABASE_PROFILE] if pragmas is None else pragmas
+        self._idle: list[sqlite3.Connection] = []
+        self._open = 0
+        self._opened = 0
+        self._reused = 0
+        self._available = threading.Condition()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection, which goes back to the pool at the end of the with statement."""
+        with self._available:
+            while not self._idle and self._open >= self.max_size:
+                self._available.wait()
+            if self._idle:
+                connection = self._idle.pop()
+                self._reused += 1
+            else:
+                connection = self._connect()
+        try:
+            yield connection
+        except BaseException:
+            # Otherwise the next borrower of the connection would commit what was written before the error
+            if connection.in_transaction:
+                connection.rollback()
+            raise
+        finally:
+            with self._available:
+                self._idle.append(connection)
+                self._available.notify()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections are borrowed by one thread at a time, but not always by the thread that opened them
+        connection = sqlite3.connect(self.name, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        for pragma, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+        if self._opened == 0:
+            migrate(connection)
+        self._open += 1
+        self._opened += 1
+        return connection
+
+    @property
+    def stats(self) -> PoolStats:
+        """Return a snapshot of how the pool has been used."""
+        with self._available:
+            return PoolStats(self._opened, self._reused, self._open, self.max_size)
+
+    def close(self) -> None:
+        """Close the connections that aren't in use.
+
+        Commits in the write-ahead log of a WAL database are copied into the database file first, and the log is
+        emptied, so the database file alone holds everything.
+        """
+        with self._available:
+            if self._idle:
+                self._idle[0].execute("PRAGMA wal_checkpoint(TRUNCATE)")  # Does nothing without WAL
+            for connection in self._idle:
+                connection.close()
+            self._open -= len(self._idle)
+            self._idle.clear()
+
+
+# Pools of the process, keyed by the name of the database
+_pools: dict[str | Path, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str | Path | None = None) -> ConnectionPool:
+    """Return the pool of the process for the database with the given name, the game's database by default."""
+    name = name or PATH.joinpath(".store.db")
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = ConnectionPool(name)
+        return _pools[name]
+
+
+# Thread that coroutines run their queries in, so that waiting on SQLite never blocks the event loop. Queries
+# run one at a time, in the order they were made.
+database_thread = BoundedExecutor(
+    ThreadPoolExecutor(1, thread_name_prefix="database"),
+    name="database",
+    max_pending=DATABASE_QUEUE_SIZE,
+)
+
+
 class Database:
     """Class that handles interactions with the database."""
 
     __table_name__ = None
 
-    def __init__(self, name: str | None = None) -> None:
-        # Default name of the database
-        self.name = name or PATH.joinpath(".store.db")
-
-        # Connection to the database
-        self.__connection = sqlite3.connect(self.name)
-        self.__connection.row_factory = sqlite3.Row
-        self.__cursor = self.__connection.cursor()
-
-        # initialize database
-        self.__cursor.executescript(SCHEMA)
+    def __init__(self, name: str | None = None, pool: ConnectionPool | None = None) -> None:
+        # Connections to the database, which are shared with all other repositories of the process
+        self.pool = pool or get_pool(name)
+        self.name = self.pool.name
 
     @property
-    def connection(self) -> sqlite3.Connection:
-        """Connection property of database."""
-        return self.__connection
+    def cursor(self) -> AbstractContextManager[sqlite3.Cursor]:
+        """Cursor on a pooled connection, to use in a with statement. The connection goes back after it."""
+        return self._cursor()
 
-    @property
-    def cursor(self) -> sqlite3.Cursor:
-        """Cursor property of database."""
-        return closing(self.connection.cursor())
+    @contextmanager
+    def _cursor(self) -> Iterator[sqlite3.Cursor]:
+        with self.pool.connection() as connection, closing(connection.cursor()) as cursor:
+            yield cursor
 
     def execute_command(self, command: str, data: tuple = ()) -> bool:
         """Execute the given command."""
-        cursor = self.connection.cursor()
-        if cursor.execute(command, data):
-            self.connection.commit()  # Commit the changes to the DB
-            return True
-        return False
+        with self.pool.connection() as connection:
+            if connection.execute(command, data):
+                connection.commit()  # Commit the changes to the DB
+                return True
+            return False
 
     def disconnect(self) -> bool:
-        """Close the database connection."""
-        return not bool(self.connection.close())
+        """Close the database connections that aren't in use."""
+        self.pool.close()
+        return True
 
     def __str__(self) -> str:
         db_str = f"Database <name:{self.name}"
@@ -130,9 +333,44 @@ class PlayerDetail(Database):
             VALUES (:username, :level, :score, :completed)
         """
 
+        with self.pool.connection() as connection:
+            connection.executemany(command, data)
+            connection.commit()
+
+    def insert_plays(self, username: str, plays: tuple[dict], progress: dict) -> None:
+        """Insert plays of the user into player_detail and set their player_progress, in one transaction."""
+        insert = """
+            INSERT INTO player_detail (username, level, score, completed)
+            VALUES (:username, :level, :score, :completed)
+        """
+        upsert = """
+            INSERT INTO player_progress(username, completed, unlocked, next_level, best_scores)
+            VALUES (:username, :completed, :unlocked, :next_level, :best_scores)
+            ON CONFLICT(username) DO UPDATE SET
+                completed = excluded.completed,
+                unlocked = excluded.unlocked,
+                next_level = excluded.next_level,
+                best_scores = excluded.best_scores
+        """
+
+        with self.pool.connection() as connection, connection:  # Commits, or rolls back if a statement fails
+            connection.executemany(insert, plays)
+            connection.execute(upsert, {"username": username, **progress})
+
+    def get_progress(self, username: str) -> sqlite3.Row | None:
+        """Get progress of user from player_progress, with their map coordinate if they have one."""
         with self.cursor as cursor:
-            cursor.executemany(command, data)
-        self.connection.commit()
+            cursor.execute(
+                """
+                SELECT completed, unlocked, next_level, best_scores, coord_x, coord_y
+                FROM player_progress
+                LEFT JOIN map USING (username)
+                WHERE username = ?
+            """,
+                (username,),
+            )
+
+            return cursor.fetchone()
 
     def get_map_coordinates(self, username: str) -> tuple | None:
         """Get map coordinate of user."""
@@ -151,31 +389,30 @@ class PlayerDetail(Database):
                 return row["coord_x"], row["coord_y"]
             return None
 
-    def update_map_coordinates(self, username: str, coord_x: int, coord_y: int) -> None:
-        """Update map coordinate of user."""
-        # check if user exists in database
+    def get_all_map_coordinates(self) -> list:
+        """Get map coordinates of all users."""
         with self.cursor as cursor:
             cursor.execute(
                 """
-                SELECT username
+                SELECT username, coord_x, coord_y
                 FROM map
-                WHERE username = ?
             """,
-                (username,),
             )
 
-            user = cursor.fetchone()
+            return cursor.fetchall()
 
-        if user is not None:
-            command = """
-                UPDATE map
-                SET coord_x = ?, coord_y = ?
-                WHERE username = ?
-            """
-        else:
-            command = """
-            INSERT INTO map(coord_x, coord_y, username)
-            VALUES (?,?,?);
-            """
+    def update_map_coordinates(self, username: str, coord_x: int, coord_y: int) -> None:
+        """Update map coordinate of user."""
+        self.upsert_many_map_coordinates([(username, coord_x, coord_y)])
+
+    def upsert_many_map_coordinates(self, coordinates: list[tuple[str, int, int]]) -> None:
+        """Set the map coordinates of many users in one transaction, given as (username, coord_x, coord_y)."""
+        command = """
+            INSERT INTO map(username, coord_x, coord_y)
+            VALUES (?, ?, ?)
+            ON CONFLICT(username) DO UPDATE SET coord_x = excluded.coord_x, coord_y = excluded.coord_y
+        """
 
-        self.execute_command(command, (coord_x, coord_y, username))
+        with self.pool.connection() as connection:
+            connection.executemany(command, coordinates)
+            connection.commit()
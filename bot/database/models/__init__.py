@@ -1,4 +1,14 @@
-from .player import PlayDetail, Player, PlayerRepo, PlayHistory
+from .player import AsyncPlayerRepo, PlayDetail, Player, PlayerRepo, PlayHistory, PositionBuffer, Progress
 from .score import Score, ScoreSheet
 
-__all__ = ["Player", "PlayDetail", "PlayHistory", "PlayerRepo", "Score", "ScoreSheet"]
+__all__ = [
+    "AsyncPlayerRepo",
+    "Player",
+    "PlayDetail",
+    "PlayHistory",
+    "PlayerRepo",
+    "PositionBuffer",
+    "Progress",
+    "Score",
+    "ScoreSheet",
+]
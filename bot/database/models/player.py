@@ -1,8 +1,18 @@
 from __future__ import annotations
 
-from typing import NamedTuple, Protocol
+import asyncio
+import json
+import threading
+from typing import TYPE_CHECKING, NamedTuple, Protocol
 
-from database.database import PlayerDetail
+from config import PLAYER_CACHE_IDLE, PLAYER_CACHE_SIZE, POSITION_FLUSH_INTERVAL
+from database.database import PlayerDetail, database_thread
+from utils.cache import LRUCache
+from utils.metrics import counters
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from sqlite3 import Row
 
 LEVELS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]
 SPECIAL_LEVELS = [12, 13, 14]
@@ -25,6 +35,12 @@ class PlayerDB(Protocol):
     def insert(self, username: str, level: int, status: str, score: int) -> None:
         """Insert into player table."""
 
+    def get_progress(self, username: str) -> Row | None:
+        """Return player progress and position."""
+
+    def insert_plays(self, username: str, plays: tuple[dict], progress: dict) -> None:
+        """Insert plays and set progress in one transaction."""
+
 
 class PlayDetail:
     """Class model for play session."""
@@ -165,13 +181,96 @@ class PlayHistory(list):
         return [play.summary() for play in sorted(set(self))]
 
 
+class Progress:
+    """Summary of a player's plays, which is all the game needs to know about them while it runs.
+
+    It is stored in the player_progress table, so that a player is loaded from a single row instead of every play.
+    Levels are stored as bitmasks, where bit `1 << level` is set for every level in the mask.
+    """
+
+    def __init__(self, completed: int = 0, unlocked: int = 0, best_scores: dict[int, int] | None = None) -> None:
+        self.completed = completed  # Levels with a completed play
+        self.unlocked = unlocked  # Levels with a play that isn't completed, like special levels that were unlocked
+        self.best_scores = best_scores or {}  # Highest score of every level with a play
+
+    @classmethod
+    def from_plays(cls, plays: Iterable[PlayDetail]) -> Progress:
+        """Return the progress of the plays."""
+        progress = cls()
+        for play in plays:
+            progress.add(play)
+        return progress
+
+    @classmethod
+    def from_row(cls, row: Row) -> Progress:
+        """Return the progress stored in a row of player_progress."""
+        best_scores = {int(level): score for level, score in json.loads(row["best_scores"]).items()}
+        return cls(row["completed"], row["unlocked"], best_scores)
+
+    def as_row(self) -> dict:
+        """Represent progress as a row of player_progress, without the username."""
+        return {
+            "completed": self.completed,
+            "unlocked": self.unlocked,
+            "next_level": self.next_level,
+            "best_scores": json.dumps(self.best_scores),
+        }
+
+    def add(self, play: PlayDetail) -> None:
+        """Count a new play."""
+        if play.completed:
+            self.completed |= 1 << play.level
+        else:
+            self.unlocked |= 1 << play.level
+        self.best_scores[play.level] = max(play.score, self.best_scores.get(play.level, play.score))
+
+    @staticmethod
+    def levels(mask: int) -> list[int]:
+        """Return the levels in the mask, in order."""
+        return [level for level in LEVELS if mask & 1 << level]
+
+    @property
+    def played(self) -> bool:
+        """Return whether there is a play of any level."""
+        return bool(self.completed | self.unlocked)
+
+    @property
+    def max_level(self) -> int:
+        """Return the highest level with a play, 1 if there is none.
+
+        Special levels not included.
+        """
+        played = [level for level in self.levels(self.completed | self.unlocked) if level not in SPECIAL_LEVELS]
+        return max(played, default=1)
+
+    @property
+    def next_level(self) -> int:
+        """Return the level to play next on the standard path."""
+        level = self.max_level
+        if not self.completed & 1 << level:
+            return level
+        return level if level == MAX_LEVEL else level + 1
+
+
 class Player:
-    """Object model for player."""
+    """Object model for player.
 
-    def __init__(self, username: str, details: list, coord: tuple | None = None) -> None:
+    A player is loaded either with the progress of their plays, or with all of their plays in history, from which
+    the progress is derived. Without them, history only holds the plays that were added since the player was loaded.
+    """
+
+    def __init__(
+        self,
+        username: str,
+        details: list | None = None,
+        coord: tuple | None = None,
+        progress: Progress | None = None,
+    ) -> None:
         self.username = username
-        self.history = PlayHistory([PlayDetail(**record) for record in details], username=username)
+        self.history = PlayHistory([PlayDetail(**record) for record in details or []], username=username)
+        self.progress = Progress.from_plays(self.history) if progress is None else progress
         self.position = Position(*coord) if coord else Position(0, 0)
+        self._map_name: str | None = None
 
     def __repr__(self) -> str:
         return f"Player<username={self.username} @ {self.position}>"
@@ -179,16 +278,12 @@ class Player:
     @property
     def max_level(self) -> int:
         """Returns max level."""
-        return self.history.max_level_played.level if self.history else 0
+        return self.progress.max_level if self.progress.played else 0
 
     @property
     def next_level(self) -> int:
         """Returns next level."""
-        # current level is the max played level
-        play = self.history.max_level_played
-        if not play.completed:
-            return play.level
-        return play.level if play.level == MAX_LEVEL else play.level + 1
+        return self.progress.next_level
 
     @property
     def summary(self) -> list[dict]:
@@ -199,7 +294,10 @@ class Player:
         # - special levels unlocked
 
         # get completed levels
-        summary = self.history.summary(completed=True)
+        summary = [
+            {"lvl_id": level, "available": True, "completed": True}
+            for level in self.progress.levels(self.progress.completed)
+        ]
 
         # include next level
         summary.append(
@@ -211,33 +309,56 @@ class Player:
         )
 
         # If summary does not include completed special levels, add uncompleted but available special levels
-        special_levels = set(self.history.get_plays_by_level(start=12, stop=14))
-        for special in special_levels:
-            if special.completed:
-                continue
-            summary.append(special.summary())
+        summary.extend(
+            {"lvl_id": level, "available": True, "completed": False}
+            for level in self.progress.levels(self.progress.unlocked)
+            if level in SPECIAL_LEVELS
+        )
 
         return summary
 
+    @property
+    def map_name(self) -> str:
+        """Return the file name of the map variant that shows the player's progress.
+
+        It is derived from the progress once, and again only after complete_level or unlock_level changed it.
+        """
+        if self._map_name is None:
+            progress = "done" if self.max_level == MAX_LEVEL else f"lvl{self.next_level}"
+            played = self.progress.completed | self.progress.unlocked
+            special = ""
+            if self.progress.completed & 1 << 12:  # Level A
+                special += "a"
+            if played & 1 << 13:  # Level B
+                special += "b"
+            if played & 1 << 14:  # Level C
+                special += "c"
+            self._map_name = f"map-{progress}-{special}.png" if special else f"map-{progress}.png"
+        return self._map_name
+
     @property
     def new_data(self) -> list[dict]:
         """Returns data added to history but not in database."""
-        if not self.history:
+        if not self.history and not self.progress.played:
             return [{"username": self.username, "level": 1, "score": 0, "completed": False}]
         return [play.as_dict() for play in self.history.new_plays]
 
     def unlock_level(self, level: int) -> None:
         """Unlock level for player."""
-        if (plays := self.history.get_plays_by_level(level)) and not any(filter(lambda play: play.available, plays)):
+        if (self.progress.completed | self.progress.unlocked) & 1 << level:
             print(f"Level {level} is already unlocked")
             return  # Level is already unlocked
         play = PlayDetail(username=self.username, level=level, score=0, available=True, completed=False)
         self.history.append(play)
+        self.progress.add(play)
+        self._map_name = None
 
     def complete_level(self, level: int, score: int) -> None:
         """Mark level as completed."""
         play = PlayDetail(username=self.username, level=level, score=score, completed=True)
         self.history.append(play)
+        self.progress.add(play)
+        self._map_name = None
 
     def set_position(self, x: int, y: int) -> None:
         """Set player position."""
@@ -248,26 +369,233 @@ class Player:
         return self.position
 
 
+class PlayerChanges(NamedTuple):
+    """Changes of a player that aren't in the database yet, taken from the player by PlayerRepo.take_changes.
+
+    Apart from new_plays, which is only used to give the plays back if they can't be written, these are plain values
+    that are safe to write from another thread while the player keeps changing.
+    """
+
+    username: str
+    plays: tuple[dict, ...]  # Rows for player_detail
+    progress: dict | None  # Row for player_progress, if there are new plays
+    position: Position
+    new_plays: list[PlayDetail]
+
+
+class PositionBuffer:
+    """Latest map positions of players that haven't been written to the database yet.
+
+    Every step on the map changes a player's position, so positions are written behind: they are kept here, and
+    flush writes all of them in one transaction. Reads of positions that are still buffered are served from the
+    buffer. The buffer is filled from the event loop and flushed from the database thread, so it is locked.
+
+    Flushes and the positions they write are counted in the "position flushes" and "positions flushed" counters.
+    """
+
+    def __init__(self, db: PlayerDetail | None = None, interval: float = POSITION_FLUSH_INTERVAL) -> None:
+        self.db = db or PlayerDetail()
+        self.interval = interval
+        self._positions: dict[str, Position] = {}
+        self._lock = threading.Lock()
+        self._flush_task: asyncio.Task | None = None
+
+    def get(self, username: str) -> Position | None:
+        """Return the buffered position of the player, or None if it was flushed."""
+        with self._lock:
+            return self._positions.get(username)
+
+    def positions(self) -> dict[str, Position]:
+        """Return the buffered position of every player."""
+        with self._lock:
+            return dict(self._positions)
+
+    def set(self, username: str, position: Position) -> None:
+        """Buffer the player's position, replacing the one that was buffered before."""
+        with self._lock:
+            self._positions[username] = position
+
+    def flush(self) -> None:
+        """Write the buffered positions to the database in one transaction.
+
+        If the write fails, the positions are buffered again, unless they were replaced in the meantime.
+        """
+        with self._lock:
+            positions, self._positions = self._positions, {}
+        if not positions:
+            return
+        try:
+            self.db.upsert_many_map_coordinates([(username, *position) for username, position in positions.items()])
+        except BaseException:
+            with self._lock:
+                self._positions = positions | self._positions
+            raise
+        counters["position flushes"] += 1
+        counters["positions flushed"] += len(positions)
+
+    def schedule_flush(self) -> None:
+        """Flush in the database thread after the interval, unless a flush is already scheduled.
+
+        Must be called from the event loop.
+        """
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.sleep(self.interval)
+            await database_thread.run(self.flush)
+        except Exception as error:  # noqa: BLE001, retried below
+            print(f"Failed to save map positions: {error!r}")
+        finally:
+            self._flush_task = None
+        if self.positions():
+            self.schedule_flush()  # Positions that were buffered during the flush, or again after it failed
+
+
+# Buffer of the positions of the process, which are written to the game's database
+position_buffer = PositionBuffer()
+
+# Players of the process that are loaded from the game's database, by username. Every get of a loaded player
+# returns the same Player, so changes made by a level are seen by the map the player has open, and vice versa.
+player_cache: LRUCache[str, Player] = LRUCache(PLAYER_CACHE_SIZE, ttl=PLAYER_CACHE_IDLE, sliding=True)
+
+
 class PlayerRepo:
     """Handles interaction between database and python models."""
 
-    def __init__(self, db: PlayerDB | None = None) -> None:
+    def __init__(self, db: PlayerDB | None = None, positions: PositionBuffer | None = None) -> None:
         self.db = db or PlayerDetail()
+        # Where positions are written behind, if they aren't written to the database right away
+        self.positions = positions
 
     def get(self, username: str) -> Player:
-        """Get player detail from database."""
+        """Get player detail from database, reading their progress and position from a single row."""
+        row = self.db.get_progress(username)
+        if row is None:
+            # New players, and players from before player_progress, whose progress is derived from their plays once
+            player = self.get_with_history(username)
+            if player.history:
+                self.db.insert_plays(username, (), player.progress.as_row())
+            return player
+        coordinate = self.positions and self.positions.get(username)
+        if coordinate is None and row["coord_x"] is not None:
+            coordinate = row["coord_x"], row["coord_y"]
+        return Player(username, coord=coordinate, progress=Progress.from_row(row))
+
+    def get_with_history(self, username: str) -> Player:
+        """Get player detail from database, with every play of the player, for analytics and replays."""
         details = self.db.get(username)
-        coordinate = self.db.get_map_coordinates(username)
+        coordinate = self.positions and self.positions.get(username)
+        if coordinate is None:
+            coordinate = self.db.get_map_coordinates(username)
         return Player(username, details, coordinate)
 
+    def get_positions(self) -> dict[str, Position]:
+        """Get the map position of every player from the database."""
+        positions = {
+            row["username"]: Position(row["coord_x"], row["coord_y"]) for row in self.db.get_all_map_coordinates()
+        }
+        if self.positions:
+            positions |= self.positions.positions()
+        return positions
+
     def save(self, player: Player) -> None:
         """Save player detail to database."""
-        data = player.new_data
-        if data:
-            data = tuple(data)
-            self.db.insert_many(data)
-            # clear new_data after saving
-            player.new_data.clear()
-
-        coord_x, coord_y = player.get_position()
-        self.db.update_map_coordinates(player.username, coord_x, coord_y)
+        changes = self.take_changes(player)
+        try:
+            self.write(changes)
+        except Exception:
+            self.restore(player, changes)
+            raise
+
+    @staticmethod
+    def take_changes(player: Player) -> PlayerChanges:
+        """Take the changes of the player that aren't in the database yet, clearing its new plays.
+
+        Must be called from the thread that changes the player. Give the changes back with restore if they can't be
+        written.
+        """
+        new_plays = list(player.history.new_plays)
+        if not player.history and not player.progress.played:
+            # First play of a new player, which isn't in the history
+            new_plays = [PlayDetail(**player.new_data[0])]
+            player.progress.add(new_plays[0])
+        player.history.new_plays.clear()
+        plays = tuple(play.as_dict() for play in new_plays)
+        progress = player.progress.as_row() if plays else None
+        return PlayerChanges(player.username, plays, progress, player.get_position(), new_plays)
+
+    def write(self, changes: PlayerChanges) -> None:
+        """Write changes taken from a player to the database."""
+        if changes.plays:
+            self.db.insert_plays(changes.username, changes.plays, changes.progress)
+
+        if self.positions:
+            self.positions.set(changes.username, changes.position)
+        else:
+            coord_x, coord_y = changes.position
+            self.db.update_map_coordinates(changes.username, coord_x, coord_y)
+
+    @staticmethod
+    def restore(player: Player, changes: PlayerChanges) -> None:
+        """Give the new plays of changes that couldn't be written back to the player, so the next save writes them."""
+        player.history.new_plays[:0] = changes.new_plays
+
+
+class AsyncPlayerRepo:
+    """PlayerRepo for coroutines, which runs its queries in the database thread.
+
+    The time queries spend waiting for the thread and running are recorded in the "database wait" and "database"
+    timings. With the game's database, positions are written behind through position_buffer, and loaded players
+    are shared through player_cache, which saves write through.
+    """
+
+    def __init__(
+        self,
+        db: PlayerDB | None = None,
+        positions: PositionBuffer | None = None,
+        players: LRUCache[str, Player] | None = None,
+    ) -> None:
+        self.repo = PlayerRepo(db, position_buffer if db is None else positions)
+        self.players = player_cache if db is None else players
+
+    async def get(self, username: str) -> Player:
+        """Get player detail from database."""
+        if self.players is None:
+            return await database_thread.run(self.repo.get, username)
+        player = self.players.get(username)
+        if player is None:
+            player = await database_thread.run(self.repo.get, username)
+            if username in self.players:  # Loaded by another get while this one waited, and maybe in use already
+                return self.players.get(username, player)
+            self.players.put(username, player)
+        return player
+
+    async def get_positions(self) -> dict[str, Position]:
+        """Get the map position of every player from the database."""
+        return await database_thread.run(self.repo.get_positions)
+
+    async def _write(self, player: Player, changes: PlayerChanges) -> None:
+        try:
+            await database_thread.run(self.repo.write, changes)
+        except Exception:
+            self.repo.restore(player, changes)
+            raise
+
+    async def save(self, player: Player) -> None:
+        """Save player detail to database.
+
+        The changes are taken from the player on the event loop, so only plain values are handed to the database
+        thread, while the player may change again.
+        """
+        changes = self.repo.take_changes(player)
+        if changes.plays or self.repo.positions is None:
+            # Shielded, so a cancelled caller can't lose track of whether the plays were written
+            await asyncio.shield(asyncio.ensure_future(self._write(player, changes)))
+        else:
+            self.repo.write(changes)  # Only buffers the position, without a query
+        if self.repo.positions:
+            self.repo.positions.schedule_flush()
+        if self.players is not None:
+            self.players.put(player.username, player)
@@ -0,0 +1,42 @@
+import io
+
+from PIL import Image
+
+# File extension of the frames encoded in each format
+EXTENSIONS = {
+    "png": "png",
+    "png-palette": "png",
+    "webp": "webp",
+    "webp-lossy": "webp",
+    "jpeg": "jpg",
+}
+
+
+def encode(image: Image.Image, format: str, *, compress_level: int = 6, quality: int = 80) -> bytes:
+    """Encode the image in the given format.
+
+    The supported formats are:
+    - "png": lossless PNG, compressed with the given zlib compress_level (0-9)
+    - "png-palette": PNG reduced to a palette of 256 colors, which is much smaller but lossy
+    - "webp": lossless WebP, where quality is the effort spent on compression (0-100)
+    - "webp-lossy": lossy WebP in the given quality (0-100)
+    - "jpeg": JPEG in the given quality (0-95), without transparency
+
+    Raises a ValueError for any other format.
+    """
+    with io.BytesIO() as encoded:
+        if format == "png":
+            image.save(encoded, "PNG", compress_level=compress_level)
+        elif format == "png-palette":
+            image.quantize(256, method=Image.Quantize.FASTOCTREE).save(encoded, "PNG", optimize=True)
+        elif format == "webp":
+            image.save(encoded, "WEBP", lossless=True, quality=quality)
+        elif format == "webp-lossy":
+            image.save(encoded, "WEBP", quality=quality)
+        elif format == "jpeg":
+            image.convert("RGB").save(encoded, "JPEG", quality=quality)
+        else:
+            error = f"Unsupported frame format: {format}"
+            raise ValueError(error)
+        # Hands over the buffer without copying it, since nothing writes to it afterwards
+        return encoded.getvalue()
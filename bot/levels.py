@@ -4,9 +4,9 @@ from typing import Protocol
 
 import discord
 from controller import Controller
-from database.models.player import Player, PlayerRepo, Position
+from database.models.player import AsyncPlayerRepo, Player, Position
 from discord import File, Interaction
-from map import Map, generate_map, image_to_discord_file
+from map import Map, map_to_discord_file
 from questions import Question, QuestionStatus, question_factory
 from story import StoryPage, StoryView
 
@@ -61,32 +61,33 @@ class Level(Protocol):
 
     async def return_to_map(self, interaction: Interaction, map: Map) -> None:
         """Return to the map after the level is exited."""
+        # A new view loads the player again, since the level may have changed their progress
+        view = await Map.create(interaction.user)
         position = map.player.get_position()
         if position == (12, 1):  # Move player out of B cave
             position = Position(11, 1)
         if position == (13, 4):  # Move player out of C cave
             position = Position(12, 4)
-        map.player.set_position(*position)
-        PlayerRepo().save(map.player)
-
-        img = image_to_discord_file(
-            generate_map(
-                position=position,
-                player_username=interaction.user.name,
-                player_display_name=interaction.user.display_name,
-            ),
-            image_name := "image",
+        view.player.set_position(*position)
+        view.shown_position = position
+        view.update_buttons()
+        await AsyncPlayerRepo().save(view.player)
+
+        img = await map_to_discord_file(
+            position,
+            player=view.player,
+            player_display_name=interaction.user.display_name,
         )
         embed = discord.Embed(
             title=f"\U0001f5fa {interaction.user.display_name}'s map",
             description="Press the arrow keys to move around.",
             color=discord.Color.blurple(),
         )
-        embed.set_image(url=f"attachment://{image_name}.png")
+        embed.set_image(url=f"attachment://{img.filename}")
         await interaction.edit_original_response(
             attachments=[img],
             embed=embed,
-            view=Map(interaction.user),
+            view=view,
         )
 
     def get_hearts_file(self) -> File:
@@ -103,7 +104,7 @@ class Level(Protocol):
 
     async def run(self, interaction: Interaction, map: Map) -> None:
         """Run the level."""
-        player = PlayerRepo().get(interaction.user.name)
+        player = await AsyncPlayerRepo().get(interaction.user.name)
         if not self._level_unlocked(player):
             await interaction.response.send_message("Level is locked. Keep playing to unlock it!", ephemeral=True)
             return
@@ -200,9 +201,9 @@ class Level(Protocol):
 
     async def on_success(self, interaction: Interaction) -> Interaction:
         """Call when the player succeeds the level."""
-        player = PlayerRepo().get(interaction.user.name)
+        player = await AsyncPlayerRepo().get(interaction.user.name)
         player.complete_level(level=self.id, score=1)
-        PlayerRepo().save(player)
+        await AsyncPlayerRepo().save(player)
         return await self._success_story(interaction=interaction)
 
 
@@ -259,9 +260,9 @@ class Level4(Level):  # noqa: D101
 
     async def on_success(self, interaction: Interaction[discord.Client]) -> Interaction:
         """Unlock special level A."""
-        player = PlayerRepo().get(interaction.user.name)
+        player = await AsyncPlayerRepo().get(interaction.user.name)
         player.unlock_level(level=12)
-        PlayerRepo().save(player)
+        await AsyncPlayerRepo().save(player)
         return await super().on_success(interaction)
 
 
@@ -315,9 +316,9 @@ class Level11(Level):  # noqa: D101
 
     async def on_success(self, interaction: Interaction[discord.Client]) -> Interaction:
         """Unlock special level B."""
-        player = PlayerRepo().get(interaction.user.name)
+        player = await AsyncPlayerRepo().get(interaction.user.name)
         player.unlock_level(level=13)
-        PlayerRepo().save(player)
+        await AsyncPlayerRepo().save(player)
         return await super().on_success(interaction)
 
     def _success_more_pages(self) -> list[StoryPage]:
@@ -348,9 +349,9 @@ class LevelB(Level):  # noqa: D101
 
     async def on_success(self, interaction: Interaction[discord.Client]) -> Interaction:
         """Unlock special level C."""
-        player = PlayerRepo().get(interaction.user.name)
+        player = await AsyncPlayerRepo().get(interaction.user.name)
         player.unlock_level(level=14)
-        PlayerRepo().save(player)
+        await AsyncPlayerRepo().save(player)
         return await super().on_success(interaction)
 
     def _success_more_pages(self) -> list[StoryPage]:
@@ -4,12 +4,25 @@ from pathlib import Path
 import async_tio
 import discord
 from controller import Controller
+from database.database import PoolStats, get_pool
+from database.models.player import AsyncPlayerRepo, player_cache, position_buffer
 from discord.ext import commands
 from dotenv import load_dotenv
 from levels import register_all_levels
-from map import Map, generate_map, image_to_discord_file
+from map import (
+    Map,
+    asset_cache,
+    frame_cache,
+    frame_quality,
+    label_cache,
+    map_to_discord_file,
+    render_pool,
+    world_map_to_discord_file,
+)
 from story import StoryPage, StoryView
+from utils.cache import CacheStats
 from utils.eval import eval_python
+from utils.metrics import Timings, counters, timings
 
 load_dotenv()
 
@@ -49,21 +62,18 @@ async def get_map(interaction: discord.Interaction) -> None:
         return
     await story.last_interaction.response.defer(thinking=False)
 
-    map_view = Map(interaction.user)
-    img = image_to_discord_file(
-        generate_map(
-            map_view.player.get_position(),
-            player_username=interaction.user.name,
-            player_display_name=interaction.user.display_name,
-        ),
-        image_name := "image",
+    map_view = await Map.create(interaction.user)
+    img = await map_to_discord_file(
+        map_view.player.get_position(),
+        player=map_view.player,
+        player_display_name=interaction.user.display_name,
     )
     embed = discord.Embed(
         title=f"\U0001f5fa {interaction.user.display_name}'s map",
         description="Press the arrow keys to move around.",
         color=discord.Color.blurple(),
     )
-    embed.set_image(url=f"attachment://{image_name}.png")
+    embed.set_image(url=f"attachment://{img.filename}")
     await interaction.edit_original_response(
         attachments=[img],
         embed=embed,
@@ -71,6 +81,21 @@ async def get_map(interaction: discord.Interaction) -> None:
     )
 
 
+@bot.tree.command(name="worldmap", description="See where every player is on the map")
+async def show_world_map(interaction: discord.Interaction) -> None:
+    """Show the map with every player on it."""
+    await interaction.response.defer(thinking=True)
+    positions = await AsyncPlayerRepo().get_positions()
+    img = await world_map_to_discord_file(positions)
+    embed = discord.Embed(
+        title="\U0001f5fa World map",
+        description=f"{len(positions)} players are on their way to becoming true Pythonistas.",
+        color=discord.Color.blurple(),
+    )
+    embed.set_image(url=f"attachment://{img.filename}")
+    await interaction.followup.send(embed=embed, file=img)
+
+
 @bot.tree.command(name="level", description="Play a specific level without opening the map")
 async def play_level(interaction: discord.Interaction, level: int) -> None:
     """Play a specific level without opening the map."""
@@ -78,7 +103,7 @@ async def play_level(interaction: discord.Interaction, level: int) -> None:
     if chosen_level is None:
         await interaction.response.send_message("Level not found.", ephemeral=True)
         return
-    await chosen_level().run(interaction=interaction, map=Map(interaction.user))
+    await chosen_level().run(interaction=interaction, map=await Map.create(interaction.user))
 
 
 @bot.tree.command(name="eval", description="Evaluate Python code")
@@ -103,6 +128,59 @@ async def eval_code(interaction: discord.Interaction, *, code: str) -> None:
     )
 
 
+def describe_cache(name: str, stats: CacheStats) -> str:
+    """Describe the state of a cache in a single line."""
+    return (
+        f"{name}: {stats.hits} hits, {stats.misses} misses ({stats.hit_rate:.0%} hit rate), "
+        f"{stats.entries} entries using {stats.size / 2**20:.1f}/{stats.max_size / 2**20:.0f} MiB, "
+        f"{stats.evictions} evictions, {stats.expirations} expirations"
+    )
+
+
+def describe_pool(name: str, stats: PoolStats) -> str:
+    """Describe the usage of a connection pool in a single line."""
+    return f"{name}: {stats.open}/{stats.max_size} open, {stats.opened} opened, {stats.reused} reused"
+
+
+def describe_players(stats: CacheStats) -> str:
+    """Describe the players that are loaded in a single line."""
+    return (
+        f"Players: {stats.entries}/{stats.max_size} loaded, {stats.hits} hits, {stats.misses} misses "
+        f"({stats.hit_rate:.0%} hit rate), {stats.evictions} evictions, {stats.expirations} idle"
+    )
+
+
+def describe_timings(name: str, durations: Timings) -> str:
+    """Describe recorded durations in a single line."""
+    return (
+        f"{name}: {durations.count} runs, p50 {durations.percentile(50) * 1000:.0f} ms, "
+        f"p95 {durations.percentile(95) * 1000:.0f} ms"
+    )
+
+
+@bot.tree.command(name="stats", description="Show rendering statistics of the bot")
+async def show_stats(interaction: discord.Interaction) -> None:
+    """Show cache statistics. Only available to the owner of the bot."""
+    if not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("Only the owner of the bot can see its stats.", ephemeral=True)
+        return
+    lines = [
+        describe_cache("Assets", asset_cache.stats),
+        describe_cache("Name boxes", label_cache.stats),
+        describe_cache("Frames", frame_cache.stats),
+        describe_timings("Render", timings["render"]),
+        describe_timings("Render queue wait", timings["render wait"]),
+        describe_timings("Database", timings["database"]),
+        describe_timings("Database queue wait", timings["database wait"]),
+        f"Renders pending: {render_pool.pending}",
+        f"Frame quality: level {frame_quality.level} of {len(frame_quality.levels) - 1}, 0 being full quality",
+        describe_pool("Database connections", get_pool().stats),
+        describe_players(player_cache.stats),
+        *(f"{name}: {count}" for name, count in sorted(counters.items())),
+    ]
+    await interaction.response.send_message("```\n" + "\n".join(lines) + "\n```", ephemeral=True)
+
+
 # Bot ready message
 @bot.event
 async def on_ready() -> None:
@@ -115,10 +193,15 @@ async def on_ready() -> None:
         print(f"Err: {e}")
 
 
-# Load levels
-register_all_levels()
-print("Loaded levels:", ", ".join(str(level.id) for level in Controller().levels))
+# Render worker processes import this module too, so they must not load the levels or start the bot
+if __name__ == "__main__":
+    # Load levels
+    register_all_levels()
+    print("Loaded levels:", ", ".join(str(level.id) for level in Controller().levels))
 
-
-# Start the bot
-bot.run(getenv("DISCORD_BOT_KEY"))
+    # Start the bot
+    try:
+        bot.run(getenv("DISCORD_BOT_KEY"))
+    finally:
+        position_buffer.flush()  # Save the positions of the last moves
+        get_pool().close()  # Moves the commits out of the write-ahead log into the database file
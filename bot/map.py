@@ -1,22 +1,60 @@
+import asyncio
 import io
 import json
+import multiprocessing
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from time import perf_counter
 
 import discord
-from config import Emoji
+from config import (
+    ASSET_CACHE_BYTES,
+    FRAME_CACHE_BYTES,
+    FRAME_CACHE_TTL,
+    FRAME_COMPRESS_LEVEL,
+    FRAME_FORMAT,
+    FRAME_QUALITY,
+    LABEL_CACHE_BYTES,
+    MAP_PACK_PATH,
+    MAP_TILES_PATH,
+    PREFETCH_CONCURRENCY,
+    RENDER_DOWNGRADE_P95,
+    RENDER_DOWNGRADE_PENDING,
+    RENDER_POOL,
+    RENDER_QUEUE_SIZE,
+    RENDER_SERVER_SOCKET,
+    RENDER_SERVER_TIMEOUT,
+    RENDER_WORKERS,
+    Emoji,
+)
 from controller import Controller
-from database.models.player import PlayerRepo
+from database.models.player import AsyncPlayerRepo, Player, Position
+from encoders import EXTENSIONS, encode
+from mapgrid import MOVE_DELTAS, MapGrid, Move
+from maplayers import MapLayers
+from mappack import MapPack, fingerprint
+from maptiles import assemble
 from matplotlib import font_manager
 from PIL import Image, ImageDraw, ImageFont
+from renderclient import RenderClient, RenderError
+from utils.cache import LRUCache
+from utils.executor import BoundedExecutor
+from utils.metrics import counters
+from utils.quality import FrameQuality, QualityController
 from utils.view import UserOnlyView
+from worldmap import WorldMap
 
-path_bot = Path("bot")
+path_bot = Path(__file__).parent  # Not relative to the working directory, so tests can load the map too
 path_assets = path_bot / "assets"
 path_maps = path_assets / "map"
+path_layers = path_maps / "layers"
 path_font = font_manager.findfont(font_manager.FontProperties(family="sans-serif", weight="normal"))
 
 CAMERA_H = 400
 CAMERA_W = 600
+WORLD_MAP_W = 1200  # Width of the world map, which shows the whole map scaled down
 SquareOrigo = (637, 1116.5)
 SquareDeltaX = (111.3, -52)  # Pixels travelled when moving X on map
 SquareDeltaY = (111.3, 52)  # Pixels travelled when moving Y on map
@@ -25,22 +63,170 @@ SquareDeltaZ = (0, -105)  # Pixels travelled when moving Z on map
 
 with Path.open(path_bot / "map_z.json") as f:
     map_z = json.load(f)
+grid = MapGrid(map_z, SquareOrigo, SquareDeltaX, SquareDeltaY, SquareDeltaZ)
+
+# Decoded images, keyed by path and mode, or by file and entry for map tiles. They are shared between all renders,
+# so they must never be modified in place
+asset_cache: LRUCache[tuple[Path, str | tuple[int, int]], Image.Image] = LRUCache(
+    max_size=ASSET_CACHE_BYTES,
+    sizeof=lambda image: image.width * image.height * len(image.getbands()),
+)
+
+
+def load_asset(path: Path, mode: str = "RGBA") -> Image.Image:
+    """Return the decoded image at the given path, only decoding it if it isn't cached.
+
+    Maps are kept in RGB, since cropping outside of an RGB image fills the area with opaque black.
+    """
+    return asset_cache.get_or_load((path, mode), lambda: Image.open(path).convert(mode))
+
+
+# Map variants are composed from the base map and the layers committed in layers.json, see maplayers.py
+map_layers = MapLayers(path_layers / "layers.json") if (path_layers / "layers.json").exists() else None
+
+
+def load_map(map_name: str) -> Image.Image:
+    """Return the decoded RGB map variant, composing it from its layers if there are any.
+
+    Composed variants are cached like decoded ones, so each combination of unlocks is only composed once.
+    """
+    if map_layers is None:
+        return load_asset(path_maps / map_name, mode="RGB")
+    return asset_cache.get_or_load(
+        (path_maps / map_name, "RGB"),
+        lambda: map_layers.compose(map_name, load_asset(path_maps / map_layers.base, mode="RGB"), load_asset),
+    )
+
+
+# Name boxes with the player's name drawn in them, keyed by the name, and labels of the world map, keyed by a
+# tuple of "world" and the label
+label_cache: LRUCache[str | tuple[str, str], Image.Image] = LRUCache(
+    max_size=LABEL_CACHE_BYTES,
+    sizeof=lambda image: image.width * image.height * len(image.getbands()),
+)
+
+# Encoded frames, keyed by map variant, player position, display name and quality
+frame_cache: LRUCache[tuple[str, Position, str | None, FrameQuality], bytes] = LRUCache(
+    max_size=FRAME_CACHE_BYTES,
+    sizeof=len,
+    ttl=FRAME_CACHE_TTL,
+)
+
+
+def _render_executor() -> Executor:
+    """Create the executor that renders run in, as configured by RENDER_POOL."""
+    if RENDER_POOL == "thread":
+        return ThreadPoolExecutor(RENDER_WORKERS, thread_name_prefix="render")
+    # Worker processes are spawned rather than forked, since forking the running bot isn't safe
+    return ProcessPoolExecutor(
+        RENDER_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_limit_asset_cache,
+        initargs=(ASSET_CACHE_BYTES // RENDER_WORKERS,),
+    )
+
+
+def _limit_asset_cache(max_size: int) -> None:
+    """Lower the memory budget of the asset cache of a render worker process to its share of ASSET_CACHE_BYTES."""
+    asset_cache.max_size = max_size
+
+
+render_pool = BoundedExecutor(_render_executor(), name="render", max_pending=RENDER_QUEUE_SIZE)
+
+# Qualities that frames are rendered in, from full quality down to what is used while the renderer is overloaded
+FRAME_QUALITIES = [
+    FrameQuality(scale=1, compress_level=FRAME_COMPRESS_LEVEL, quality=FRAME_QUALITY),
+    FrameQuality(scale=0.8, compress_level=1, quality=min(FRAME_QUALITY, 60)),
+    FrameQuality(scale=0.6, compress_level=1, quality=min(FRAME_QUALITY, 40)),
+]
+render_client = RenderClient(RENDER_SERVER_SOCKET, RENDER_SERVER_TIMEOUT) if RENDER_SERVER_SOCKET else None
+
+frame_quality = QualityController(
+    FRAME_QUALITIES,
+    name="map quality",
+    max_pending=RENDER_DOWNGRADE_PENDING,
+    max_p95=RENDER_DOWNGRADE_P95,
+)
+
+
+def all_tiles() -> list[tuple[int, int]]:
+    """Return the coordinates of every tile on the map."""
+    return list(grid.tiles)
+
+
+def map_variant_paths() -> list[Path]:
+    """Return the paths of all map variants."""
+    return sorted(path_maps.glob("map-*.png"))
+
+
+def map_asset_paths() -> list[Path]:
+    """Return the paths of the files that the map variants are made from."""
+    paths = map_variant_paths()
+    if map_layers is not None:
+        paths += [path_layers / "layers.json", *map_layers.files()]
+    return paths
+
+
+def map_fingerprint() -> str:
+    """Return the fingerprint of the assets that the map tiles are cut from."""
+    return fingerprint(map_asset_paths())
+
+
+def pack_fingerprint() -> str:
+    """Return the fingerprint of the assets that the frames in a map pack are rendered from."""
+    return fingerprint([*map_asset_paths(), path_assets / "player.png", path_bot / "map_z.json"])
+
+
+map_pack = MapPack.open(MAP_PACK_PATH, pack_fingerprint()) if MAP_PACK_PATH.exists() else None
+map_tiles = MapPack.open(MAP_TILES_PATH, map_fingerprint()) if MAP_TILES_PATH.exists() else None
+
+
+def load_tile(map_name: str, tile: tuple[int, int]) -> Image.Image | None:
+    """Return the tile of the map variant at the column and row, or None if it is outside the map.
+
+    Tiles are cached by where they are stored, so a tile shared between variants is only decoded once. Raw tiles
+    aren't decoded or cached at all, they are read-only views of the memory map that all render processes share.
+    """
+    entry = map_tiles.locate(map_name, tile)
+    if entry is None:
+        return None
+    if map_tiles.format == "raw":
+        return map_tiles.view(entry)
+    return asset_cache.get_or_load((MAP_TILES_PATH, entry), lambda: map_tiles.read(entry).convert("RGB"))
 
 
 def validate_coord(coord: tuple[int, int]) -> bool:
-    """Return whether or not the coordinate is not in the map."""
-    return not (map_z.get(str(coord[0])) is None or map_z[str(coord[0])].get(str(coord[1])) is None)
+    """Return whether or not the coordinate is a tile on the map."""
+    return grid.is_tile(*coord)
 
 
 class Map(UserOnlyView):
     """Allows the user to navigate the map."""
 
-    def __init__(self, user: discord.User | discord.Member) -> None:
+    def __init__(self, user: discord.User | discord.Member, player: Player) -> None:
         super().__init__(original_user=user)
-        self.player = PlayerRepo().get(user.name)
+        self.player = player
         self.user = user
+        self.shown_position = self.player.get_position()  # Position in the frame the user currently sees
+        self._navigating = False
+        self._latest_interaction: discord.Interaction | None = None
+        self._prefetch: asyncio.Task | None = None
+        self._render: asyncio.Task | None = None  # Render of the frame the navigation in progress waits for
+        # Only the levels the player unlocked are listed, so the special levels aren't spoiled before they are found
+        level_ids = dict.fromkeys(level["lvl_id"] for level in self.player.summary)
+        levels = (Controller().get_level_by_id(level_id) for level_id in level_ids)
+        self.travel.options = [
+            discord.SelectOption(label=f"{level.name}: {level.topic}", value=str(level.id))
+            for level in levels
+            if level is not None
+        ]
         self.update_buttons()
 
+    @classmethod
+    async def create(cls, user: discord.User | discord.Member) -> "Map":
+        """Load the user's player from the database and create a map for them."""
+        return cls(user, await AsyncPlayerRepo().get(user.name))
+
     async def move(
         self,
         interaction: discord.Interaction,
@@ -52,7 +238,6 @@ class Map(UserOnlyView):
         new_coord = old_x + x, old_y + y
         if validate_coord(new_coord):
             self.player.set_position(*new_coord)
-            PlayerRepo().save(self.player)
             await self.navigate(interaction)
         # If the new position is invalid, do nothing. Since the buttons are
         # disabled if the resulting move would be invalid, this should only
@@ -70,22 +255,18 @@ class Map(UserOnlyView):
 
     def update_buttons(self) -> None:
         """Update the buttons to match the current position."""
-
-        def should_disable(x: int, y: int) -> bool:
-            return not validate_coord((x, y))
-
-        x, y = self.player.get_position()
+        moves = grid.moves_from(*self.player.get_position())
         for child in self.children:
             if not isinstance(child, discord.ui.Button):
                 continue
             if child.custom_id == "button_left":
-                child.disabled = should_disable(x - 1, y)
+                child.disabled = Move.LEFT not in moves
             if child.custom_id == "button_up":
-                child.disabled = should_disable(x, y - 1)
+                child.disabled = Move.UP not in moves
             if child.custom_id == "button_down":
-                child.disabled = should_disable(x, y + 1)
+                child.disabled = Move.DOWN not in moves
             if child.custom_id == "button_right":
-                child.disabled = should_disable(x + 1, y)
+                child.disabled = Move.RIGHT not in moves
             if child.custom_id == "button_confirm":
                 child.disabled = not Controller().is_level(self.player.get_position())
 
@@ -93,29 +274,90 @@ class Map(UserOnlyView):
         self,
         interaction: discord.Interaction,
     ) -> None:
-        """Update map to the new position."""
+        """Update map to the new position.
+
+        Moves made while a frame is being rendered only change the player's position. When the frame is done,
+        it is dropped if the player has moved on since, so only the frame of the latest position is sent.
+        """
         await interaction.response.defer(thinking=False)
-        embed = discord.Embed(
-            title=f"\U0001f5fa {self.user.display_name}'s Map",
-            color=discord.Color.blurple(),
-        )
-        embed.description = self.get_embed_description(self.player.get_position())
-        img = image_to_discord_file(
-            generate_map(
-                self.player.get_position(),
-                player_username=interaction.user.name,
-                player_display_name=self.user.display_name,
-            ),
-            image_name := "image",
-        )
-        embed.set_image(url=f"attachment://{image_name}.png")
-        self.update_buttons()
+        self._latest_interaction = interaction
+        self._cancel_prefetch()  # Its neighbours aren't next to the player anymore
+        if self._navigating:
+            counters["map moves coalesced"] += 1
+            if self._render is not None and render_droppable(self._render):
+                self._render.cancel()  # Its render hasn't started, and would only be dropped once done
+            return  # The navigation in progress picks up the new position
+        self._navigating = True
+        try:
+            await self._show_latest_position()
+        finally:
+            self._navigating = False
+
+    async def _show_latest_position(self) -> None:
+        """Render and send frames until the user sees the player's latest position."""
+        while (position := self.player.get_position()) != self.shown_position:
+            self._cancel_prefetch()  # Started for a frame the player has moved on from while it was being sent
+            self._render = asyncio.ensure_future(
+                map_to_discord_file(position, player=self.player, player_display_name=self.user.display_name),
+            )
+            try:
+                img = await self._render
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise  # The navigation itself was cancelled, not just the render of a position moved on from
+                continue
+            finally:
+                self._render = None
+            if self.player.get_position() != position:
+                counters["map frames superseded"] += 1
+                continue
 
-        await interaction.edit_original_response(
-            embed=embed,
-            attachments=[img],
-            view=self,
-        )
+            await AsyncPlayerRepo().save(self.player)
+            embed = discord.Embed(
+                title=f"\U0001f5fa {self.user.display_name}'s Map",
+                color=discord.Color.blurple(),
+            )
+            embed.description = self.get_embed_description(position)
+            embed.set_image(url=f"attachment://{img.filename}")
+            self.update_buttons()
+
+            await self._latest_interaction.edit_original_response(
+                embed=embed,
+                attachments=[img],
+                view=self,
+            )
+            self.shown_position = position
+            if self.player.get_position() == position:  # Otherwise the loop goes on to the new position
+                self._prefetch = prefetcher.start(
+                    position,
+                    player=self.player,
+                    player_display_name=self.user.display_name,
+                )
+
+    def _cancel_prefetch(self) -> None:
+        if self._prefetch is not None:
+            self._prefetch.cancel()
+            self._prefetch = None
+
+    @discord.ui.select(
+        placeholder="Travel to a level",
+        custom_id="select_travel",
+        row=3,
+    )
+    async def travel(
+        self,
+        interaction: discord.Interaction,
+        select: discord.ui.Select,
+    ) -> None:
+        """Walk the shortest path to the chosen level, showing only where the walk ends."""
+        level = Controller().get_level_by_id(int(select.values[0]))  # noqa: PD011, not pandas
+        path = None if level is None else grid.shortest_path(self.player.get_position(), level.map_position)
+        if path is None:
+            await interaction.response.send_message("There is no way to get to that level from here.", ephemeral=True)
+            return
+        self.player.set_position(*path[-1])
+        counters["map steps travelled"] += len(path) - 1
+        await self.navigate(interaction)
 
     @discord.ui.button(
         emoji=discord.PartialEmoji.from_str(Emoji.ARROW_LEFT.value),
@@ -196,14 +438,9 @@ def get_camera_box(
 
     offset is specified in pixels.
     """
-    x, y = position
-    z = map_z[str(x)][str(y)]
-    pos_x = round(
-        SquareOrigo[0] + x * SquareDeltaX[0] + y * SquareDeltaY[0] + z * SquareDeltaZ[0] + offset[0],
-    )
-    pos_y = round(
-        SquareOrigo[1] + x * SquareDeltaX[1] + y * SquareDeltaY[1] + z * SquareDeltaZ[1] + offset[1],
-    )
+    centre_x, centre_y = grid.centre(*position)
+    pos_x = round(centre_x + offset[0])
+    pos_y = round(centre_y + offset[1])
     return (
         pos_x - round(CAMERA_W / 2),
         pos_y - round(CAMERA_H / 2),
@@ -212,12 +449,23 @@ def get_camera_box(
     )
 
 
+def encode_image(image: Image.Image, quality: FrameQuality = FRAME_QUALITIES[0]) -> bytes:
+    """Encode a Pillow.Image.Image in the format set by FRAME_FORMAT, scaled down and compressed as in quality."""
+    if quality.scale != 1:
+        size = (round(image.width * quality.scale), round(image.height * quality.scale))
+        image = image.resize(size, Image.Resampling.BILINEAR)
+    return encode(image, FRAME_FORMAT, compress_level=quality.compress_level, quality=quality.quality)
+
+
+def frame_to_discord_file(frame: bytes, file_name: str = "image") -> discord.File:
+    """Get a discord.File from an encoded frame. Do not include extension in the file name."""
+    # BytesIO shares the memory of the frame rather than copying it, as long as nothing writes to it
+    return discord.File(fp=io.BytesIO(frame), filename=f"{file_name}.{EXTENSIONS[FRAME_FORMAT]}")
+
+
 def image_to_discord_file(image: Image.Image, file_name: str = "image") -> discord.File:
     """Get a discord.File from a Pillow.Image.Image. Do not include extension in the file name."""
-    with io.BytesIO() as image_binary:
-        image.save(image_binary, "PNG")
-        image_binary.seek(0)
-        return discord.File(fp=image_binary, filename=file_name + ".png")
+    return frame_to_discord_file(encode_image(image), file_name)
 
 
 def _crop_map(
@@ -228,22 +476,47 @@ def _crop_map(
 ) -> Image.Image:
     """Crop the map so the camera centers on the given position, with the given offset.
 
-    The function currently only supports the fully unlocked map.
+    The crop is assembled from the tiles it covers if the map is baked into tiles, and cut from the whole map
+    otherwise. Either way it is an RGB image, black where it goes past the edge of the map.
     """
-    img = Image.open(path_maps / map_name)
     box = get_camera_box(position, offset)
-    return img.crop(box)
+    if map_tiles is not None and map_name in map_tiles:
+        return assemble(box, map_tiles.size[0], lambda tile: load_tile(map_name, tile))
+    return load_map(map_name).crop(box)
 
 
 def draw_player(position: tuple[int, int], map_name: str = "map-done-abc.png") -> tuple[Image.Image, int]:
     """Draw the player on the map centered on the given position.
 
+    The frame is taken from the map pack if there is one, and composed from the map otherwise.
     Returns the map with the player on it and the player's height.
     """
-    player = Image.open(path_assets / "player.png").convert("RGBA")
+    if map_pack is not None and (bg := map_pack.get(map_name, position)) is not None:
+        return bg, load_asset(path_assets / "player.png").height
+    return compose_player(position, map_name=map_name)
+
+
+def compose_player(position: tuple[int, int], map_name: str = "map-done-abc.png") -> tuple[Image.Image, int]:
+    """Crop the map and paste the player on it, centered on the given position.
+
+    Returns the map with the player on it and the player's height.
+    """
+    return paste_player(crop_for_player(position, map_name=map_name))
+
+
+def crop_for_player(position: tuple[int, int], map_name: str = "map-done-abc.png") -> Image.Image:
+    """Return the RGBA crop of the map that the player standing on the given position is pasted on."""
+    player_h = load_asset(path_assets / "player.png").height
+    return _crop_map(position, offset=(0, round(-player_h / 2)), map_name=map_name).convert("RGBA")
+
+
+def paste_player(bg: Image.Image) -> tuple[Image.Image, int]:
+    """Paste the player in the middle of a crop from crop_for_player.
+
+    Returns the crop with the player on it and the player's height.
+    """
+    player = load_asset(path_assets / "player.png")
     player_w, player_h = player.size
-    offset = (0, round(-player_h / 2))
-    bg = _crop_map(position, offset=offset, map_name=map_name).convert("RGBA")
     bg.paste(
         player,
         (
@@ -255,10 +528,58 @@ def draw_player(position: tuple[int, int], map_name: str = "map-done-abc.png") -
     return bg, player_h
 
 
+@lru_cache(maxsize=32)
+def _font(size: int) -> ImageFont.FreeTypeFont:
+    """Load the name box font in the given size."""
+    return ImageFont.truetype(path_font, size)
+
+
+def fit_font(text: str, max_width: float, max_size: int = 24) -> ImageFont.FreeTypeFont:
+    """Return the font in the largest size up to max_size in which the text is at most max_width wide."""
+    low, high = 1, max_size
+    while low < high:
+        # Binary search, since the text gets wider with every font size
+        size = (low + high + 1) // 2
+        if _font(size).getlength(text) <= max_width:
+            low = size
+        else:
+            high = size - 1
+    return _font(low)
+
+
+def render_name_box(player_name: str) -> Image.Image:
+    """Render the name box with the player's name in it.
+
+    Name boxes are cached by name and shared between renders, so they must never be modified in place.
+    """
+
+    def render() -> Image.Image:
+        name_box = load_asset(path_assets / "name-box.png").copy()
+        name_box_w, name_box_h = name_box.size
+        draw = ImageDraw.Draw(name_box)
+        font = fit_font(player_name, name_box_w - 10)
+        left, top, _, bottom = draw.textbbox(
+            (round(name_box_w / 2), 0),
+            player_name,
+            font=font,
+            align="center",
+            anchor="mm",
+        )
+        draw.text(
+            (left, top + name_box_h / 2 - (bottom - top) / 2),
+            player_name,
+            font=font,
+            fill="black",
+        )
+        return name_box
+
+    return label_cache.get_or_load(player_name, render)
+
+
 def draw_name_box(bg: Image.Image, player_name: str, player_h: int) -> None:
     """Draw a name box with the player's name on the map."""
-    name_box = Image.open(path_assets / "name-box.png").convert("RGBA")
-    name_box_w, name_box_h = name_box.size
+    name_box = render_name_box(player_name)
+    name_box_w, _ = name_box.size
     bg.paste(
         name_box,
         (
@@ -267,56 +588,15 @@ def draw_name_box(bg: Image.Image, player_name: str, player_h: int) -> None:
         ),
         name_box,
     )
-    draw = ImageDraw.Draw(bg)
-
-    fontsize = 24
-    font = ImageFont.truetype(path_font, fontsize)
-    while font.getlength(player_name) > name_box_w - 10:
-        # Decrease font size until the text fits in the box
-        fontsize -= 1
-        font = ImageFont.truetype(path_font, fontsize)
-    left, top, _, bottom = draw.textbbox(
-        (
-            round(CAMERA_W / 2),
-            round(CAMERA_H / 2 - player_h / 2 - 40),
-        ),
-        player_name,
-        font=font,
-        align="center",
-        anchor="mm",
-    )
-    draw.text(
-        (left, top + name_box_h / 2 - (bottom - top) / 2),
-        player_name,
-        font=font,
-        fill="black",
-    )
-
-
-def get_map_name(player_name: str) -> str:
-    """Get the file name for the map version that only has the player's levels unlocked."""
-    player = PlayerRepo().get(player_name)
-    file_name = "map-done" if player.max_level == 11 else f"map-lvl{player.next_level}"  # noqa: PLR2004, 11 is last level
-
-    completed_levels = player.history.summary(completed=True)
-    all_levels = player.history.summary()
-    special = ""
-    if any(level["lvl_id"] == 12 for level in completed_levels):  # noqa: PLR2004
-        special += "a"
-    if any(level["lvl_id"] == 13 for level in all_levels):  # noqa: PLR2004
-        special += "b"
-    if any(level["lvl_id"] == 14 for level in all_levels):  # noqa: PLR2004
-        special += "c"
-
-    return f"{file_name}{f'-{''.join(lvl for lvl in special)}' if special else ''}.png"
 
 
 def generate_map(
     position: tuple[int, int],
     *,
-    player_username: str,
+    player: Player | None = None,
     with_player: bool = True,
     player_display_name: str | None = None,
+    map_name: str | None = None,
 ) -> Image.Image:
     """Generate a map centered on the provided map coordinate.
 
@@ -326,13 +606,250 @@ def generate_map(
     If with_player is True, the player will be added to the center of the camera.
     The camera centers on the player centered and shifts the background image slightly,
     so the player correctly stands on the point specified by MapPosition.
+
+    The map variant is the one for the progress of player, unless map_name is given.
     """
+    map_name = map_name or player.map_name
     if not with_player:
-        return _crop_map(position, map_name=get_map_name(player_username))
-    bg, player_h = draw_player(position, map_name=get_map_name(player_username))
+        return _crop_map(position, map_name=map_name)
+    bg, player_h = draw_player(position, map_name=map_name)
 
     if player_display_name is None:
         return bg
     draw_name_box(bg, player_display_name, player_h)
 
     return bg
+
+
+def render_frame(
+    map_name: str,
+    position: tuple[int, int],
+    player_display_name: str | None,
+    quality: FrameQuality,
+) -> bytes:
+    """Generate the given map variant with the player on it and encode it in the given quality.
+
+    This runs in the render pool, so it must not depend on anything but its arguments.
+    """
+    return encode_image(generate_map(position, player_display_name=player_display_name, map_name=map_name), quality)
+
+
+async def render_map(
+    position: tuple[int, int],
+    *,
+    player: Player,
+    player_display_name: str | None = None,
+) -> bytes:
+    """Generate the map with the player on it and encode it.
+
+    Frames are rendered by the render server if there is one, and in the render pool of this process otherwise.
+    While the renderer is overloaded, frames are rendered in a lower quality, see frame_quality.
+    """
+    key = (player.map_name, Position(*position), player_display_name, frame_quality.current(render_pool.pending))
+    if render_client is not None:
+        start = perf_counter()
+        try:
+            frame = await render_client.render(*key)
+        except (OSError, TimeoutError, RenderError) as error:
+            counters["render server failures"] += 1
+            print(f"Rendering the frame locally, since the render server failed: {error!r}")
+        else:
+            frame_quality.record(perf_counter() - start)
+            return frame
+    return await render_cached(key)
+
+
+async def render_cached(key: tuple[str, Position, str | None, FrameQuality]) -> bytes:
+    """Return the frame for the arguments of render_frame, rendering it in the render pool if it isn't cached.
+
+    Frames are cached, so a player walking back and forth between tiles doesn't render the same frame twice.
+    A cached frame in a higher quality is returned as well, so the frame is only rendered in a lower quality when the
+    renderer is overloaded and the frame isn't cached in any quality at least as high.
+    When the last caller waiting on a render is cancelled, the render is cancelled too if it is still waiting for a
+    slot in the render pool, like the frames of positions a player has moved on from while the renderer is busy.
+    """
+    frame = _cached_frame(key)
+    if frame is not None:
+        return frame
+    render = _rendering.get(key)
+    if render is None:
+        render = asyncio.ensure_future(_render_and_cache(key))
+        _rendering[key] = render
+        render.add_done_callback(lambda _: _rendering.pop(key, None))
+    task = asyncio.current_task()
+    _waiting[key] += 1
+    _awaiting[task] = key
+    try:
+        # Shielded, so a caller that is cancelled doesn't cancel the render for everyone else waiting on it
+        return await asyncio.shield(render)
+    except asyncio.CancelledError:
+        if _droppable(key):
+            render.cancel()
+            counters["map renders cancelled"] += 1
+        raise
+    finally:
+        del _awaiting[task]
+        _waiting[key] -= 1
+        if not _waiting[key]:
+            del _waiting[key]
+
+
+def _cached_frame(key: tuple[str, Position, str | None, FrameQuality]) -> bytes | None:
+    """Return the cached frame for key, or the same frame in a higher quality, or None if neither is cached.
+
+    So frames rendered before the renderer was overloaded are still served from the cache while it is.
+    """
+    *frame, quality = key
+    higher = FRAME_QUALITIES[: FRAME_QUALITIES.index(quality)] if quality in FRAME_QUALITIES else []
+    for candidate in [*higher, quality]:
+        cached = frame_cache.get((*frame, candidate))
+        if cached is not None:
+            return cached
+    return None
+
+
+def render_droppable(task: asyncio.Task) -> bool:
+    """Return whether cancelling the task, which waits on a render in render_cached, would cancel the render too.
+
+    That is the case while the task is the only one waiting on the render, and the render is still waiting for a
+    slot in the render pool.
+    """
+    key = _awaiting.get(task)
+    return key is not None and _droppable(key)
+
+
+def _droppable(key: tuple[str, Position, str | None, FrameQuality]) -> bool:
+    render = _rendering.get(key)
+    return render is not None and not render.done() and _waiting[key] == 1 and not render_pool.handed_over(render)
+
+
+# Renders in progress, so a frame that is already being rendered, for example by the prefetcher, is awaited
+# rather than rendered again, the number of callers waiting on each of them, and the render every caller waits on
+_rendering: dict[tuple[str, Position, str | None, FrameQuality], asyncio.Future[bytes]] = {}
+_waiting: Counter[tuple[str, Position, str | None, FrameQuality]] = Counter()
+_awaiting: dict[asyncio.Task, tuple[str, Position, str | None, FrameQuality]] = {}
+
+
+async def _render_and_cache(key: tuple[str, Position, str | None, FrameQuality]) -> bytes:
+    start = perf_counter()
+    frame = await render_pool.run(render_frame, *key)
+    frame_quality.record(perf_counter() - start)
+    if key[-1] != FRAME_QUALITIES[0]:
+        counters["map frames downgraded"] += 1
+    frame_cache.put(key, frame)
+    return frame
+
+
+class NeighbourPrefetcher:
+    """Renders the frames of the tiles next to a player in the background, so their next move is served from cache.
+
+    At most max_concurrent prefetches render at once, across all players. Prefetching yields to the frames that
+    players are waiting for, so it is skipped while the render pool is more than half full. Cancelling a prefetch
+    drops the renders it hasn't started yet, while renders that already started finish into the frame cache.
+    """
+
+    def __init__(self, max_concurrent: int) -> None:
+        self.max_concurrent = max_concurrent
+        self._slots: asyncio.Semaphore | None = None
+
+    def start(
+        self,
+        position: tuple[int, int],
+        *,
+        player: Player,
+        player_display_name: str | None = None,
+    ) -> asyncio.Task | None:
+        """Start prefetching the tiles next to position, or return None if prefetching is turned off."""
+        if self.max_concurrent <= 0:
+            return None
+        if self._slots is None:
+            # Created lazily, so that the semaphore is bound to the running event loop
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        moves = grid.moves_from(*position)
+        neighbours = [(position[0] + dx, position[1] + dy) for move, (dx, dy) in MOVE_DELTAS.items() if move in moves]
+        return asyncio.create_task(self._prefetch_all(neighbours, player, player_display_name))
+
+    async def _prefetch_all(
+        self,
+        positions: list[tuple[int, int]],
+        player: Player,
+        player_display_name: str | None,
+    ) -> None:
+        await asyncio.gather(
+            *(self._prefetch(position, player, player_display_name) for position in positions),
+        )
+
+    async def _prefetch(
+        self,
+        position: tuple[int, int],
+        player: Player,
+        player_display_name: str | None,
+    ) -> None:
+        async with self._slots:
+            if render_pool.pending >= render_pool.max_pending // 2:
+                counters["map prefetches skipped"] += 1
+                return
+            await render_map(position, player=player, player_display_name=player_display_name)
+            counters["map frames prefetched"] += 1
+
+
+prefetcher = NeighbourPrefetcher(PREFETCH_CONCURRENCY)
+
+
+async def map_to_discord_file(
+    position: tuple[int, int],
+    *,
+    player: Player,
+    player_display_name: str | None = None,
+    file_name: str = "image",
+) -> discord.File:
+    """Get a discord.File of the map with the player on it. Do not include extension in the file name."""
+    frame = await render_map(position, player=player, player_display_name=player_display_name)
+    return frame_to_discord_file(frame, file_name)
+
+
+def render_world_label(label: str) -> Image.Image:
+    """Render a label of the world map, cached like name boxes."""
+
+    def render() -> Image.Image:
+        font = _font(14)
+        left, top, right, bottom = font.getbbox(label)
+        image = Image.new("RGBA", (right - left + 8, bottom - top + 6))
+        draw = ImageDraw.Draw(image)
+        draw.rounded_rectangle((0, 0, image.width - 1, image.height - 1), radius=4, fill="white", outline="black")
+        draw.text((4 - left, 3 - top), label, font=font, fill="black")
+        return image
+
+    return label_cache.get_or_load(("world", label), render)
+
+
+@lru_cache(maxsize=1)
+def get_world_map() -> WorldMap:
+    """Return the world map, which is built from the fully unlocked map when it is first needed."""
+    base = load_map("map-done-abc.png")
+    scale = WORLD_MAP_W / base.width
+    base = base.resize((WORLD_MAP_W, round(base.height * scale)), Image.Resampling.LANCZOS)
+    player = load_asset(path_assets / "player.png")
+    sprite = player.resize((round(player.width * scale), round(player.height * scale)), Image.Resampling.LANCZOS)
+
+    def anchor(tile: tuple[int, int]) -> tuple[float, float]:
+        centre_x, centre_y = grid.centre(*tile)
+        return centre_x * scale, centre_y * scale
+
+    return WorldMap(base, sprite, anchor, render_world_label)
+
+
+def render_world_frame(positions: dict[str, Position]) -> bytes:
+    """Draw every player on the world map and encode it, skipping positions that aren't on the map."""
+    on_map = {username: position for username, position in positions.items() if grid.is_tile(*position)}
+    return encode_image(get_world_map().render(on_map))
+
+
+async def world_map_to_discord_file(positions: dict[str, Position], file_name: str = "worldmap") -> discord.File:
+    """Get a discord.File of the world map with every player on it. Do not include extension in the file name.
+
+    The world map keeps its last frame to only redraw what changed, so it renders in a thread of this process
+    rather than in the render pool.
+    """
+    frame = await asyncio.to_thread(render_world_frame, positions)
+    return frame_to_discord_file(frame, file_name)
@@ -0,0 +1,118 @@
+import math
+from array import array
+from collections import deque
+from enum import IntFlag
+
+Point = tuple[float, float]
+
+
+class Move(IntFlag):
+    """Directions a player can move in on the map, combinable into a set of moves."""
+
+    LEFT = 1
+    UP = 2
+    DOWN = 4
+    RIGHT = 8
+
+
+# Change of map coordinate for every move
+MOVE_DELTAS = {
+    Move.LEFT: (-1, 0),
+    Move.UP: (0, -1),
+    Move.DOWN: (0, 1),
+    Move.RIGHT: (1, 0),
+}
+
+
+class MapGrid:
+    """The tiles of the map, compiled for constant time lookups.
+
+    The map is stored as a dense grid covering the bounding box of all tiles, with the z of every tile in
+    a flat array, indexed by the offset of the coordinate from the corner of the box. Squares that aren't
+    tiles have a z of NaN. For every tile, the moves to its neighbouring tiles and the pixel position of
+    its centre on the map image are computed up front.
+    """
+
+    def __init__(
+        self,
+        map_z: dict[str, dict[str, float]],
+        origin: Point,
+        delta_x: Point,
+        delta_y: Point,
+        delta_z: Point,
+    ) -> None:
+        coordinates = [(int(x), int(y), z) for x, column in map_z.items() for y, z in column.items()]
+        self.min_x = min(x for x, _, _ in coordinates)
+        self.min_y = min(y for _, y, _ in coordinates)
+        self.width = max(x for x, _, _ in coordinates) - self.min_x + 1
+        self.height = max(y for _, y, _ in coordinates) - self.min_y + 1
+
+        self.z = array("d", [math.nan]) * (self.width * self.height)
+        for x, y, z in coordinates:
+            self.z[self._offset(x, y)] = z
+        self.tiles = [(x, y) for x, y, _ in coordinates]
+
+        self.moves = array("B", bytes(self.width * self.height))
+        self.centres: list[Point | None] = [None] * (self.width * self.height)
+        for x, y, z in coordinates:
+            offset = self._offset(x, y)
+            for move, (dx, dy) in MOVE_DELTAS.items():
+                if self.is_tile(x + dx, y + dy):
+                    self.moves[offset] |= move
+            self.centres[offset] = (
+                origin[0] + x * delta_x[0] + y * delta_y[0] + z * delta_z[0],
+                origin[1] + x * delta_x[1] + y * delta_y[1] + z * delta_z[1],
+            )
+
+    def _offset(self, x: int, y: int) -> int:
+        """Return the offset of the coordinate in the grid arrays, which must be inside the grid."""
+        return (x - self.min_x) * self.height + (y - self.min_y)
+
+    def _inside(self, x: int, y: int) -> bool:
+        return 0 <= x - self.min_x < self.width and 0 <= y - self.min_y < self.height
+
+    def is_tile(self, x: int, y: int) -> bool:
+        """Return whether there is a tile at the coordinate."""
+        return self._inside(x, y) and not math.isnan(self.z[self._offset(x, y)])
+
+    def moves_from(self, x: int, y: int) -> Move:
+        """Return the moves that lead from the tile at the coordinate to another tile."""
+        if not self._inside(x, y):
+            return Move(0)
+        return Move(self.moves[self._offset(x, y)])
+
+    def centre(self, x: int, y: int) -> Point:
+        """Return the pixel position of the centre of the tile on the map image.
+
+        Raises a KeyError if there is no tile at the coordinate.
+        """
+        centre = self.centres[self._offset(x, y)] if self._inside(x, y) else None
+        if centre is None:
+            error = f"No tile at {(x, y)}"
+            raise KeyError(error)
+        return centre
+
+    def shortest_path(self, start: tuple[int, int], goal: tuple[int, int]) -> list[tuple[int, int]] | None:
+        """Return the tiles of a shortest walk from start to goal, both included.
+
+        Returns None if either isn't a tile, or if goal can't be reached from start.
+        """
+        if not (self.is_tile(*start) and self.is_tile(*goal)):
+            return None
+        previous: dict[tuple[int, int], tuple[int, int] | None] = {start: None}
+        queue = deque([start])
+        while queue:
+            tile = queue.popleft()
+            if tile == goal:
+                path = []
+                while tile is not None:
+                    path.append(tile)
+                    tile = previous[tile]
+                return path[::-1]
+            moves = self.moves[self._offset(*tile)]
+            for move, (dx, dy) in MOVE_DELTAS.items():
+                neighbour = (tile[0] + dx, tile[1] + dy)
+                if moves & move and neighbour not in previous:
+                    previous[neighbour] = tile
+                    queue.append(neighbour)
+        return None
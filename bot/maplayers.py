@@ -0,0 +1,134 @@
+"""Map variants composed from one base map and small overlay layers.
+
+Every map variant is the base map with the layer for the player's progress on the main path
+(`lvl2` to `lvl11`, or `done`) and the layers for the unlocked special levels (`a`, `b` and `c`)
+pasted on top, in that order. The layers and their positions on the map are listed in `layers.json`.
+
+The layers are derived from the full map variants with `python bot/maplayers.py`, run from the root
+of the repository. A layer holds the pixels that differ between a variant and the map it builds on.
+Thin differences, like outlines that are a pixel off between exports of the artwork, are left out.
+So a composed variant differs from its source by at most `TOLERANCE` levels per channel, except in
+differences thinner than three pixels, which cover at most `MAX_THIN_SHARE` of the map.
+"""
+
+import argparse
+import json
+from collections.abc import Callable
+from pathlib import Path
+
+from PIL import Image, ImageChops, ImageFilter
+
+BASE_VARIANT = "map-lvl1"
+PROGRESS_LAYERS = [*(f"lvl{level}" for level in range(2, 12)), "done"]
+SPECIAL_LAYERS = ["a", "b", "c"]
+TOLERANCE = 60
+MAX_THIN_SHARE = 0.02
+
+
+def variant_layers(map_name: str) -> list[str]:
+    """Return the names of the layers that make up a map variant, in the order they are pasted.
+
+    >>> variant_layers("map-lvl5-ab.png")
+    ['lvl5', 'a', 'b']
+    """
+    progress, _, special = map_name.removeprefix("map-").removesuffix(".png").partition("-")
+    layers = [] if progress == BASE_VARIANT.removeprefix("map-") else [progress]
+    return layers + list(special)
+
+
+class MapLayers:
+    """The layers listed in a layers.json manifest."""
+
+    def __init__(self, manifest_path: Path) -> None:
+        self.path = manifest_path.parent
+        with Path.open(manifest_path) as f:
+            manifest = json.load(f)
+        self.base: str = manifest["base"]
+        self.offsets: dict[str, tuple[int, int]] = {name: tuple(offset) for name, offset in manifest["layers"].items()}
+
+    def files(self) -> list[Path]:
+        """Return the paths of the image files of all layers."""
+        return [self.path / f"{name}.png" for name in self.offsets]
+
+    def compose(
+        self,
+        map_name: str,
+        base: Image.Image,
+        load_layer: Callable[[Path], Image.Image],
+    ) -> Image.Image:
+        """Compose the map variant from the base map, loading the RGBA layers with load_layer.
+
+        Raises a KeyError if the variant needs a layer that doesn't exist.
+        """
+        variant = base.copy()
+        for name in variant_layers(map_name):
+            layer = load_layer(self.path / f"{name}.png")
+            variant.paste(layer, self.offsets[name], layer)
+        return variant
+
+
+def extract_layer(
+    variant: Image.Image,
+    below: Image.Image,
+    threshold: int,
+    grow: int,
+) -> tuple[Image.Image, tuple[int, int]] | None:
+    """Return the pixels of variant that differ from below, with everything else transparent.
+
+    A pixel differs if any channel differs by more than threshold. Differences thinner than three pixels are
+    dropped, and the rest are grown by grow pixels to include their anti-aliased edges.
+    Returns the layer cropped to the differing pixels and its position, or None if no pixels differ.
+    """
+    difference = ImageChops.difference(variant, below).split()
+    mask = ImageChops.lighter(ImageChops.lighter(difference[0], difference[1]), difference[2])
+    mask = mask.point(lambda value: 255 if value > threshold else 0)
+    mask = mask.filter(ImageFilter.MinFilter(3)).filter(ImageFilter.MaxFilter(3))
+    mask = mask.filter(ImageFilter.MaxFilter(2 * grow + 1))
+    box = mask.getbbox()
+    if box is None:
+        return None
+    layer = variant.convert("RGBA")
+    layer.putalpha(mask)
+    return layer.crop(box), box[:2]
+
+
+def build(maps_path: Path, output_path: Path, *, threshold: int, grow: int) -> None:
+    """Derive the layers from the full map variants in maps_path and write them with their manifest."""
+
+    def load(name: str) -> Image.Image:
+        return Image.open(maps_path / f"{name}.png").convert("RGB")
+
+    base = load(BASE_VARIANT)
+    done = load("map-done")
+    sources = [(name, load(f"map-{name}"), base) for name in PROGRESS_LAYERS]
+    sources += [(name, load(f"map-done-{name}"), done) for name in SPECIAL_LAYERS]
+
+    output_path.mkdir(exist_ok=True)
+    offsets = {}
+    for name, variant, below in sources:
+        extracted = extract_layer(variant, below, threshold=threshold, grow=grow)
+        if extracted is None:
+            print(f"Skipping layer {name}, since it doesn't change the map")
+            continue
+        layer, offsets[name] = extracted
+        layer.save(output_path / f"{name}.png", optimize=True)
+        print(f"Layer {name}: {layer.width}x{layer.height} at {offsets[name]}")
+
+    with Path.open(output_path / "layers.json", "w") as f:
+        json.dump({"base": f"{BASE_VARIANT}.png", "layers": offsets}, f, indent=2)
+        f.write("\n")
+
+
+def main() -> None:
+    """Derive the map layers from the full map variants."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--maps", type=Path, default=Path("bot/assets/map"), help="folder of the full variants")
+    parser.add_argument("--output", type=Path, default=Path("bot/assets/map/layers"), help="where to write layers")
+    parser.add_argument("--threshold", type=int, default=40, help="smallest channel difference that is kept")
+    parser.add_argument("--grow", type=int, default=3, help="pixels to grow each difference by")
+    args = parser.parse_args()
+    build(args.maps, args.output, threshold=args.threshold, grow=args.grow)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Pre-rendered map frames, baked ahead of time into a single pack file.
+
+Every camera box the map can show is known in advance: one per map variant and tile. The pack holds
+the background of each of those frames with the player already drawn on it, so rendering a frame at
+runtime only needs a slice of the memory mapped pack plus the name box.
+
+The pack file consists of an 8 byte magic number, the length of the index as a 4 byte little endian
+integer, the index as JSON, and finally the frames. The index maps every map variant and tile to the
+offset and length of its frame in the file. Identical frames are only stored once.
+
+Bake the pack with `python bot/mappack.py` from the root of the repository.
+
+The same format stores the map variants cut into tiles, see maptiles.py.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import struct
+from collections.abc import Iterable
+from pathlib import Path
+
+from PIL import Image
+
+MAGIC = b"MAPPACK\x01"
+HEADER = struct.Struct("<I")  # Length of the index
+
+
+def fingerprint(paths: Iterable[Path]) -> str:
+    """Return a digest of the contents of the given files, used to tell if a pack is out of date."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _key(position: tuple[int, int]) -> str:
+    return f"{position[0]},{position[1]}"
+
+
+class MapPack:
+    """Read-only view of a baked pack file."""
+
+    def __init__(self, path: Path) -> None:
+        with Path.open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            error = f"{path} is not a map pack"
+            raise ValueError(error)
+        (index_length,) = HEADER.unpack_from(self._mmap, len(MAGIC))
+        index_start = len(MAGIC) + HEADER.size
+        self.index = json.loads(self._mmap[index_start : index_start + index_length])
+        self.format: str = self.index["format"]
+        self.size: tuple[int, int] = tuple(self.index["size"])
+        self.fingerprint: str = self.index["fingerprint"]
+
+    @classmethod
+    def open(cls, path: Path, fingerprint: str) -> "MapPack | None":
+        """Open the pack at path, or return None if it was baked from other assets than the given fingerprint."""
+        pack = cls(path)
+        if pack.fingerprint != fingerprint:
+            print(f"Ignoring {path}, since the map assets changed after it was baked")
+            pack.close()
+            return None
+        return pack
+
+    def __contains__(self, map_name: str) -> bool:
+        return map_name in self.index["frames"]
+
+    def locate(self, map_name: str, position: tuple[int, int]) -> tuple[int, int] | None:
+        """Return the offset and length of the frame for the map variant and tile, or None if it isn't in the pack.
+
+        Identical frames are stored once, so they have the same offset.
+        """
+        entry = self.index["frames"].get(map_name, {}).get(_key(position))
+        return None if entry is None else tuple(entry)
+
+    def get(self, map_name: str, position: tuple[int, int]) -> Image.Image | None:
+        """Return a copy of the baked frame for the map variant and tile, or None if it isn't in the pack."""
+        entry = self.locate(map_name, position)
+        return None if entry is None else self.read(entry)
+
+    def read(self, entry: tuple[int, int]) -> Image.Image:
+        """Return a copy of the frame at the offset and length returned by locate."""
+        if self.format == "raw":
+            # Copied in a single pass, since the frame shares memory with the pack, which is read-only
+            return self.view(entry).copy()
+        offset, length = entry
+        data = memoryview(self._mmap)[offset : offset + length]
+        with Image.open(io.BytesIO(data)) as frame:
+            frame.load()
+            return frame
+
+    def view(self, entry: tuple[int, int]) -> Image.Image:
+        """Return the raw frame at the offset and length returned by locate, without copying it.
+
+        The frame shares memory with the memory map of the pack, and through it with every other process that has
+        the pack open, so it must never be modified. Raises a ValueError if the pack isn't raw.
+        """
+        if self.format != "raw":
+            error = "Only frames of raw packs can be viewed without decoding them"
+            raise ValueError(error)
+        offset, length = entry
+        data = memoryview(self._mmap)[offset : offset + length]
+        return Image.frombuffer("RGBA", self.size, data, "raw", "RGBA", 0, 1)
+
+    def close(self) -> None:
+        """Close the memory map of the pack."""
+        self._mmap.close()
+
+
+def bake(
+    path: Path,
+    frames: Iterable[tuple[str, tuple[int, int], Image.Image]],
+    *,
+    size: tuple[int, int],
+    fingerprint: str,
+    format: str = "png",
+    compress_level: int = 6,
+) -> None:
+    """Write the (map variant, tile, frame) triples to a pack file at path.
+
+    Frames are stored as PNG, or as raw RGBA pixels if format is "raw", which skips decoding the frame
+    at runtime at the cost of a much larger pack.
+    """
+    blobs = io.BytesIO()
+    offsets: dict[bytes, tuple[int, int]] = {}  # Frame digest to offset and length in blobs
+    index_frames: dict[str, dict[str, tuple[int, int]]] = {}
+    for map_name, position, frame in frames:
+        rgba_frame = frame.convert("RGBA")
+        pixels = rgba_frame.tobytes()
+        digest = hashlib.sha256(pixels).digest()
+        if digest not in offsets:
+            if format == "raw":
+                data = pixels
+            else:
+                with io.BytesIO() as encoded:
+                    rgba_frame.save(encoded, "PNG", compress_level=compress_level)
+                    data = encoded.getvalue()
+            offsets[digest] = (blobs.tell(), len(data))
+            blobs.write(data)
+        index_frames.setdefault(map_name, {})[_key(position)] = offsets[digest]
+
+    index = {"format": format, "size": size, "fingerprint": fingerprint, "frames": index_frames}
+    # Offsets are relative to the start of the blobs until the length of the index is known
+    index_length = len(json.dumps(index).encode())
+    while True:
+        start = len(MAGIC) + HEADER.size + index_length
+        index["frames"] = {
+            map_name: {key: (start + offset, length) for key, (offset, length) in tiles.items()}
+            for map_name, tiles in index_frames.items()
+        }
+        encoded_index = json.dumps(index).encode()
+        if len(encoded_index) == index_length:
+            break
+        index_length = len(encoded_index)
+
+    # Running bots keep their memory map of the old pack, so it is replaced rather than overwritten
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(path.name + ".tmp")
+    with Path.open(temporary_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(index_length))
+        f.write(encoded_index)
+        f.write(blobs.getbuffer())
+    temporary_path.replace(path)
+    print(f"Baked {len(offsets)} unique frames for {len(index_frames)} map variants into {path}")
+
+
+def main() -> None:
+    """Bake every frame of every map variant into a pack."""
+    import map as game_map  # Imported here, since the map module loads the pack itself
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, default=game_map.MAP_PACK_PATH, help="where to write the pack")
+    # Raw by default, since decoding a PNG frame takes longer than composing it from the decoded map
+    parser.add_argument("--format", choices=["png", "raw"], default="raw", help="how frames are stored")
+    parser.add_argument("--compress-level", type=int, default=6, help="zlib compression level of PNG frames")
+    args = parser.parse_args()
+
+    def frames() -> Iterable[tuple[str, tuple[int, int], Image.Image]]:
+        for map_path in game_map.map_variant_paths():
+            for position in game_map.all_tiles():
+                frame, _ = game_map.compose_player(position, map_name=map_path.name)
+                yield map_path.name, position, frame
+            game_map.asset_cache.clear()  # Only keep one variant decoded at a time
+
+    bake(
+        args.output,
+        frames(),
+        size=(game_map.CAMERA_W, game_map.CAMERA_H),
+        fingerprint=game_map.pack_fingerprint(),
+        format=args.format,
+        compress_level=args.compress_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
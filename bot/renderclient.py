@@ -0,0 +1,74 @@
+"""Client for the render server, which renders frames for every bot process on the host, see renderserver.py.
+
+Requests and responses are messages of a 4 byte little endian length followed by that many bytes. A request is
+a JSON object with the map variant, position, display name and quality of a frame. A response starts with a
+status byte, followed by the encoded frame if the status is OK, or by an error message otherwise.
+"""
+
+import asyncio
+import json
+import struct
+from pathlib import Path
+
+from utils.quality import FrameQuality
+
+HEADER = struct.Struct("<I")  # Length of a message
+OK = b"\x00"
+ERROR = b"\x01"
+
+
+class RenderError(Exception):
+    """The render server failed to render a frame."""
+
+
+async def read_message(reader: asyncio.StreamReader) -> bytes:
+    """Read one message from the stream.
+
+    Raises an asyncio.IncompleteReadError if the stream ends first.
+    """
+    (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return await reader.readexactly(length)
+
+
+def write_message(writer: asyncio.StreamWriter, data: bytes) -> None:
+    """Write one message to the stream. Drain the writer afterwards."""
+    writer.write(HEADER.pack(len(data)))
+    writer.write(data)
+
+
+class RenderClient:
+    """Renders frames in the render server listening on the Unix socket at path."""
+
+    def __init__(self, path: Path, timeout: float) -> None:
+        self.path = path
+        self.timeout = timeout
+
+    async def render(
+        self,
+        map_name: str,
+        position: tuple[int, int],
+        player_display_name: str | None,
+        quality: FrameQuality,
+    ) -> bytes:
+        """Return the encoded frame of the map variant with the player at position.
+
+        Raises an OSError if the server can't be reached, a TimeoutError if it doesn't answer within the timeout,
+        and a RenderError if it fails to render the frame.
+        """
+        request = {
+            "map_name": map_name,
+            "position": position,
+            "player_display_name": player_display_name,
+            "quality": quality,
+        }
+        async with asyncio.timeout(self.timeout):
+            reader, writer = await asyncio.open_unix_connection(self.path)
+            try:
+                write_message(writer, json.dumps(request).encode())
+                await writer.drain()
+                response = await read_message(reader)
+            finally:
+                writer.close()
+        if response[:1] != OK:
+            raise RenderError(response[1:].decode())
+        return response[1:]
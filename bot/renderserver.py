@@ -0,0 +1,105 @@
+"""Render server, which renders frames for every bot process on the host from one cache and render pool.
+
+Without it, every bot process has its own frame cache, asset cache and render pool, so a frame that players of
+several processes see is rendered once per process. Bots use the server when RENDER_SERVER_SOCKET is set, and
+render frames themselves while the server can't be reached.
+
+Start it with `python bot/renderserver.py` from the root of the repository, before the bots.
+"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+import map as game_map
+from config import RENDER_SERVER_SOCKET
+from database.models.player import Position
+from renderclient import ERROR, OK, read_message, write_message
+from utils.quality import FrameQuality
+
+# Requests are only answered for these map variants, since the name of the variant is part of a path
+map_names = {path.name for path in game_map.map_variant_paths()}
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answer the render requests of one connection until the client closes it."""
+    try:
+        while True:
+            try:
+                request = await read_message(reader)
+            except asyncio.IncompleteReadError:
+                return
+            try:
+                frame = await game_map.render_cached(request_key(json.loads(request)))
+            except Exception as error:  # noqa: BLE001, reported to the client
+                write_message(writer, ERROR + repr(error).encode())
+            else:
+                write_message(writer, OK + frame)
+            await writer.drain()
+    except (ConnectionResetError, BrokenPipeError):
+        return  # The client went away, like a bot that timed out waiting for the frame
+    finally:
+        writer.close()
+
+
+def request_key(request: dict) -> tuple[str, Position, str | None, FrameQuality]:
+    """Return the key of the frame that the request asks for.
+
+    Raises a ValueError if the request is for a map variant that doesn't exist.
+    """
+    if request["map_name"] not in map_names:
+        error = f"Unknown map variant {request['map_name']!r}"
+        raise ValueError(error)
+    return (
+        request["map_name"],
+        Position(*request["position"]),
+        request["player_display_name"],
+        FrameQuality(*request["quality"]),
+    )
+
+
+async def serve(path: Path) -> None:
+    """Answer render requests on the Unix socket at path until the server is stopped.
+
+    Raises a RuntimeError if another server is listening on the socket already.
+    """
+    if await listening(path):
+        error = f"Another render server is listening on {path}"
+        raise RuntimeError(error)
+    path.unlink(missing_ok=True)  # Left behind if the last server was killed
+    server = await asyncio.start_unix_server(handle, path)
+    print(f"Rendering frames for the bots on {path}")
+    async with server:
+        await server.serve_forever()
+
+
+async def listening(path: Path) -> bool:
+    """Return whether a server accepts connections on the Unix socket at path."""
+    try:
+        _, writer = await asyncio.open_unix_connection(path)
+    except OSError:
+        return False
+    writer.close()
+    await writer.wait_closed()
+    return True
+
+
+def main() -> None:
+    """Start the render server."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=RENDER_SERVER_SOCKET,
+        required=RENDER_SERVER_SOCKET is None,
+        help="Unix socket to listen on, RENDER_SERVER_SOCKET by default",
+    )
+    args = parser.parse_args()
+    game_map.render_client = None  # The server renders the frames itself, even if it is configured to use a server
+    asyncio.run(serve(args.socket))
+
+
+# Render worker processes import this module too, so they must not start the server
+if __name__ == "__main__":
+    main()
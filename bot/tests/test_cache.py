@@ -0,0 +1,79 @@
+import unittest
+from unittest import mock
+
+from utils.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    """Test class for the LRU cache."""
+
+    def test_get_counts_hits_and_misses(self) -> None:
+        """Test that lookups are counted in the stats."""
+        cache = LRUCache(max_size=2)
+        cache.put("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        stats = cache.stats
+        assert (stats.hits, stats.misses) == (1, 1)
+        assert stats.hit_rate == 0.5  # noqa: PLR2004
+
+    def test_least_recently_used_is_evicted(self) -> None:
+        """Test that the value used longest ago is evicted first."""
+        cache = LRUCache(max_size=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        assert "a" in cache
+        assert "b" not in cache
+        assert cache.stats.evictions == 1
+
+    def test_size_budget(self) -> None:
+        """Test that the total size of the values stays within the budget."""
+        cache = LRUCache(max_size=10, sizeof=len)
+        cache.put("a", "x" * 6)
+        cache.put("b", "x" * 6)
+        assert len(cache) == 1
+        assert cache.stats.size == 6  # noqa: PLR2004
+
+    def test_value_larger_than_cache_is_not_stored(self) -> None:
+        """Test that a value that can never fit is not stored."""
+        cache = LRUCache(max_size=4, sizeof=len)
+        cache.put("a", "x" * 5)
+        assert "a" not in cache
+
+    def test_get_or_load(self) -> None:
+        """Test that the loader is only called on a miss."""
+        cache = LRUCache(max_size=2)
+        calls = []
+        for _ in range(3):
+            cache.get_or_load("a", lambda: calls.append(1) or "value")
+        assert len(calls) == 1
+
+    def test_values_expire(self) -> None:
+        """Test that values are dropped once their time to live has passed."""
+        cache = LRUCache(max_size=2, ttl=10)
+        with mock.patch("utils.cache.monotonic", return_value=100):
+            cache.put("a", 1)
+        with mock.patch("utils.cache.monotonic", return_value=105):
+            assert cache.get("a") == 1
+        with mock.patch("utils.cache.monotonic", return_value=110):
+            assert cache.get("a") is None
+        assert cache.stats.expirations == 1
+        assert cache.stats.size == 0
+
+    def test_sliding_values_expire_when_unused(self) -> None:
+        """Test that reading a value with a sliding time to live keeps it from expiring."""
+        cache = LRUCache(max_size=2, ttl=10, sliding=True)
+        with mock.patch("utils.cache.monotonic", return_value=100):
+            cache.put("a", 1)
+        with mock.patch("utils.cache.monotonic", return_value=108):
+            assert cache.get("a") == 1
+        with mock.patch("utils.cache.monotonic", return_value=116):
+            assert cache.get("a") == 1
+        with mock.patch("utils.cache.monotonic", return_value=126):
+            assert cache.get("a") is None
+
+
+if __name__ == "__main__":
+    unittest.main()
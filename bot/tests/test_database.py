@@ -0,0 +1,219 @@
+import asyncio
+import sqlite3
+import threading
+import unittest
+from collections.abc import Callable
+
+from database.database import MIGRATIONS, ConnectionPool, PlayerDetail, Score, migrate
+from database.models import AsyncPlayerRepo, PlayerRepo, PositionBuffer
+from utils.cache import LRUCache
+
+
+class TestDatabase(unittest.TestCase):
+    """Test class for the SQLite repositories, on an in-memory database."""
+
+    def setUp(self) -> None:
+        """Create an empty in-memory database."""
+        self.pool = ConnectionPool(":memory:", max_size=1)
+
+    def tearDown(self) -> None:
+        """Drop the in-memory database."""
+        self.pool.close()
+
+    def test_save_and_get_player(self) -> None:
+        """Test that a saved player is loaded again with their plays and position."""
+        player = PlayerRepo(PlayerDetail(pool=self.pool)).get("maria")
+        player.complete_level(level=1, score=100)
+        player.set_position(2, 0)
+        PlayerRepo(PlayerDetail(pool=self.pool)).save(player)
+
+        loaded = PlayerRepo(PlayerDetail(pool=self.pool)).get("maria")
+        assert loaded.get_position() == (2, 0)
+        assert loaded.next_level == 2  # noqa: PLR2004
+
+    def test_player_is_loaded_from_progress(self) -> None:
+        """Test that a saved player is loaded from their progress, the same as from all of their plays."""
+        repo = PlayerRepo(PlayerDetail(pool=self.pool))
+        player = repo.get("maria")
+        for level in (1, 2, 3):
+            player.complete_level(level=level, score=100 * level)
+        player.unlock_level(level=13)
+        player.set_position(2, 0)
+        repo.save(player)
+
+        loaded = repo.get("maria")
+        with_history = repo.get_with_history("maria")
+        assert not loaded.history
+        assert len(with_history.history) == 4  # noqa: PLR2004
+        assert loaded.summary == with_history.summary
+        assert loaded.map_name == with_history.map_name == "map-lvl4-b.png"
+        assert loaded.get_position() == (2, 0)
+        assert loaded.progress.best_scores[3] == 300  # noqa: PLR2004
+
+    def test_progress_of_old_players_is_derived(self) -> None:
+        """Test that players from before player_progress get their progress from their plays when loaded."""
+        db = PlayerDetail(pool=self.pool)
+        db.insert_many(({"username": "maria", "level": 1, "score": 100, "completed": True},))
+        assert db.get_progress("maria") is None
+
+        assert PlayerRepo(db).get("maria").next_level == 2  # noqa: PLR2004
+        assert db.get_progress("maria")["next_level"] == 2  # noqa: PLR2004
+
+    def test_connections_are_reused(self) -> None:
+        """Test that repositories share the pooled connection instead of opening their own."""
+        for _ in range(3):
+            PlayerRepo(PlayerDetail(pool=self.pool)).get("maria")
+        stats = self.pool.stats
+        assert stats.opened == 1
+        assert stats.reused == 8  # noqa: PLR2004, three queries per get of a new player, and one opens the connection
+
+    def test_failed_writes_are_rolled_back(self) -> None:
+        """Test that a write that fails halfway isn't committed by the next borrower of the connection."""
+        db = PlayerDetail(pool=self.pool)
+        with self.assertRaises(sqlite3.IntegrityError), self.pool.connection() as connection:  # noqa: PT027
+            connection.execute("INSERT INTO map(username, coord_x, coord_y) VALUES ('maria', 1, 0)")
+            connection.execute("INSERT INTO map(username, coord_x, coord_y) VALUES ('maria', 2, 0)")
+        db.update_map_coordinates("noble", 3, 0)
+        assert db.get_map_coordinates("maria") is None
+
+    def test_in_memory_pool_has_one_connection(self) -> None:
+        """Test that an in-memory pool can't open several connections, which would be separate databases."""
+        with self.assertRaises(ValueError):  # noqa: PT027
+            ConnectionPool(":memory:", max_size=2)
+
+    def test_connections_get_pragmas(self) -> None:
+        """Test that connections are opened with the pragmas of the pool."""
+        pool = ConnectionPool(":memory:", max_size=1, pragmas={"cache_size": -1024, "temp_store": "MEMORY"})
+        with pool.connection() as connection:
+            assert connection.execute("PRAGMA cache_size").fetchone()[0] == -1024  # noqa: PLR2004
+            assert connection.execute("PRAGMA temp_store").fetchone()[0] == 2  # noqa: PLR2004, MEMORY
+        pool.close()
+
+    def query_plan(self, query: Callable[[], object]) -> str:
+        """Return the query plan of the last statement that query runs."""
+        statements = []
+        with self.pool.connection() as connection:
+            connection.set_trace_callback(statements.append)  # Statements with their parameters filled in
+        query()
+        with self.pool.connection() as connection:
+            connection.set_trace_callback(None)
+            plan = connection.execute(f"EXPLAIN QUERY PLAN {statements[-1]}").fetchall()
+        return "\n".join(row["detail"] for row in plan)
+
+    def test_hot_queries_use_indexes(self) -> None:
+        """Test that loading a player and a score sheet search the indexes instead of scanning player_detail."""
+        player_plan = self.query_plan(lambda: PlayerDetail(pool=self.pool).get("maria"))
+        assert "USING INDEX player_detail_username_level" in player_plan
+        assert "TEMP B-TREE" not in player_plan  # Ordered by level by the index
+
+        score_plan = self.query_plan(lambda: Score(pool=self.pool).fetch(3))
+        assert "USING INDEX player_detail_level_score" in score_plan
+        assert "SCAN player_detail" not in score_plan
+
+    def test_migrations_are_applied_once(self) -> None:
+        """Test that migrating a database again leaves it at the same version."""
+        with self.pool.connection() as connection:
+            assert migrate(connection) == len(MIGRATIONS)
+            versions = connection.execute("SELECT version FROM schema_version").fetchall()
+        assert [row["version"] for row in versions] == list(range(1, len(MIGRATIONS) + 1))
+
+    def test_positions_are_written_behind(self) -> None:
+        """Test that buffered positions are read from the buffer, and written to the database by a flush."""
+        db = PlayerDetail(pool=self.pool)
+        positions = PositionBuffer(db)
+        repo = PlayerRepo(db, positions)
+        player = repo.get("maria")
+        for step in range(1, 4):
+            player.set_position(step, 0)
+            repo.save(player)
+
+        assert db.get_map_coordinates("maria") is None
+        assert repo.get("maria").get_position() == (3, 0)
+        assert repo.get_positions() == {"maria": (3, 0)}
+
+        positions.flush()
+        assert db.get_map_coordinates("maria") == (3, 0)
+        assert positions.get("maria") is None
+
+
+class TestAsyncPlayerRepo(unittest.IsolatedAsyncioTestCase):
+    """Test class for the repository that runs its queries in the database thread."""
+
+    def setUp(self) -> None:
+        """Create an empty in-memory database."""
+        self.pool = ConnectionPool(":memory:", max_size=1)
+
+    def tearDown(self) -> None:
+        """Drop the in-memory database."""
+        self.pool.close()
+
+    async def test_save_and_get_player(self) -> None:
+        """Test that a player saved from a coroutine is loaded again from one."""
+        repo = AsyncPlayerRepo(PlayerDetail(pool=self.pool))
+        player = await repo.get("maria")
+        player.set_position(2, 0)
+        await repo.save(player)
+
+        assert (await repo.get("maria")).get_position() == (2, 0)
+        assert await repo.get_positions() == {"maria": (2, 0)}
+
+    async def test_loaded_players_are_shared(self) -> None:
+        """Test that every get of a loaded player returns the same Player, without loading it again."""
+        players = LRUCache(max_size=10)
+        repo = AsyncPlayerRepo(PlayerDetail(pool=self.pool), players=players)
+        player = await repo.get("maria")
+        assert await repo.get("maria") is player
+        assert players.stats.misses == 1
+
+        player.complete_level(level=1, score=100)
+        await repo.save(player)
+        assert (await repo.get("maria")).next_level == 2  # noqa: PLR2004
+        assert (await AsyncPlayerRepo(PlayerDetail(pool=self.pool)).get("maria")).next_level == 2  # noqa: PLR2004
+
+    async def test_plays_made_during_a_save_are_kept(self) -> None:
+        """Test that a play made while a save is being written is written by the next save."""
+        written = threading.Event()
+        release = threading.Event()
+
+        class SlowPlayerDetail(PlayerDetail):
+            def insert_plays(self, username: str, plays: tuple[dict], progress: dict) -> None:
+                super().insert_plays(username, plays, progress)
+                written.set()
+                release.wait()
+
+        repo = AsyncPlayerRepo(SlowPlayerDetail(pool=self.pool))
+        player = await repo.get("maria")
+        player.complete_level(level=1, score=100)
+        save = asyncio.create_task(repo.save(player))
+        await asyncio.to_thread(written.wait)
+        player.complete_level(level=2, score=100)
+        release.set()
+        await save
+        await repo.save(player)
+
+        assert len(repo.repo.db.get("maria")) == 2  # noqa: PLR2004
+
+    async def test_plays_are_kept_if_the_save_fails(self) -> None:
+        """Test that plays that couldn't be written are written by the next save."""
+
+        class FailingPlayerDetail(PlayerDetail):
+            failures = 1
+
+            def insert_plays(self, username: str, plays: tuple[dict], progress: dict) -> None:
+                if self.failures:
+                    self.failures -= 1
+                    raise sqlite3.OperationalError
+                super().insert_plays(username, plays, progress)
+
+        repo = AsyncPlayerRepo(FailingPlayerDetail(pool=self.pool))
+        player = await repo.get("maria")
+        player.complete_level(level=1, score=100)
+        with self.assertRaises(sqlite3.OperationalError):  # noqa: PT027
+            await repo.save(player)
+        await repo.save(player)
+
+        assert len(repo.repo.db.get("maria")) == 1
+
+
+if __name__ == "__main__":
+    unittest.main()
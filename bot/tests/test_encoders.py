@@ -0,0 +1,37 @@
+import io
+import unittest
+
+from encoders import EXTENSIONS, encode
+from PIL import Image
+
+
+class TestEncode(unittest.TestCase):
+    """Test class for encoding frames."""
+
+    def setUp(self) -> None:
+        """Create a small RGBA frame."""
+        self.image = Image.new("RGBA", (8, 8), (10, 120, 200, 255))
+
+    def test_formats(self) -> None:
+        """Test that every format encodes to an image of that format."""
+        expected = {"png": "PNG", "png-palette": "PNG", "webp": "WEBP", "webp-lossy": "WEBP", "jpeg": "JPEG"}
+        assert expected.keys() == EXTENSIONS.keys()
+        for format, image_format in expected.items():
+            with Image.open(io.BytesIO(encode(self.image, format))) as decoded:
+                assert decoded.format == image_format, format
+                assert decoded.size == self.image.size
+
+    def test_lossless_formats(self) -> None:
+        """Test that the lossless formats keep every pixel."""
+        for format in ("png", "webp"):
+            with Image.open(io.BytesIO(encode(self.image, format))) as decoded:
+                assert decoded.convert("RGBA").tobytes() == self.image.tobytes(), format
+
+    def test_unknown_format(self) -> None:
+        """Test that an unsupported format raises a ValueError."""
+        with self.assertRaises(ValueError):  # noqa: PT027
+            encode(self.image, "gif")
+
+
+if __name__ == "__main__":
+    unittest.main()
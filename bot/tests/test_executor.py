@@ -0,0 +1,31 @@
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.executor import BoundedExecutor
+
+
+class TestBoundedExecutor(unittest.IsolatedAsyncioTestCase):
+    """Test class for the executor that bounds the calls handed to a thread or process pool."""
+
+    async def test_calls_waiting_for_a_slot_are_dropped(self) -> None:
+        """Test that a call cancelled while it waits for a slot never runs, unlike the call that has the slot."""
+        executor = BoundedExecutor(ThreadPoolExecutor(1), name="test", max_pending=1)
+        release = threading.Event()
+        calls = []
+        first = asyncio.create_task(executor.run(lambda: release.wait() and calls.append("first")))
+        second = asyncio.create_task(executor.run(lambda: calls.append("second")))
+        await asyncio.sleep(0.01)
+
+        assert executor.handed_over(first)
+        assert not executor.handed_over(second)
+        second.cancel()
+        release.set()
+        await first
+        assert calls == ["first"]
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
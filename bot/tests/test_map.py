@@ -0,0 +1,211 @@
+import asyncio
+import types
+import unittest
+from collections.abc import Callable
+from concurrent.futures import Executor, Future
+from unittest import mock
+
+import map as game_map
+from controller import Controller
+from database.models.player import Player, Position
+from utils.executor import BoundedExecutor
+from utils.metrics import counters
+
+
+class TestFitFont(unittest.TestCase):
+    """Test class for fitting display names into the name box."""
+
+    def test_largest_size_that_fits(self) -> None:
+        """Test that the name fits in the returned size, and wouldn't fit in the next one."""
+        for name, max_width in [("Maria", 60), ("Pythonista", 100), ("A much longer display name", 150)]:
+            size = game_map.fit_font(name, max_width).size
+            assert game_map._font(size).getlength(name) <= max_width  # noqa: SLF001
+            assert game_map._font(size + 1).getlength(name) > max_width  # noqa: SLF001
+
+    def test_max_size(self) -> None:
+        """Test that a short name is drawn in the largest size, even if a larger one would fit."""
+        assert game_map.fit_font("Al", 1000, max_size=24).size == 24  # noqa: PLR2004
+
+    def test_long_name_floor(self) -> None:
+        """Test that a name too long to fit in any size gets the smallest size."""
+        assert game_map.fit_font("x" * 500, 50).size == 1
+
+
+class TestRenderCached(unittest.IsolatedAsyncioTestCase):
+    """Test class for serving frames from the frame cache."""
+
+    def tearDown(self) -> None:
+        """Empty the frame cache."""
+        game_map.frame_cache.clear()
+
+    async def test_higher_quality_frame(self) -> None:
+        """Test that a frame cached in full quality is served when a lower quality is asked for."""
+        full, degraded = game_map.FRAME_QUALITIES[0], game_map.FRAME_QUALITIES[-1]
+        game_map.frame_cache.put(("map-lvl1.png", Position(3, 4), "Maria", full), b"full")
+        assert await game_map.render_cached(("map-lvl1.png", Position(3, 4), "Maria", degraded)) == b"full"
+
+    async def test_lower_quality_frame(self) -> None:
+        """Test that a frame cached in a lower quality isn't served when a higher quality is asked for."""
+        full, degraded = game_map.FRAME_QUALITIES[0], game_map.FRAME_QUALITIES[-1]
+        game_map.frame_cache.put(("map-lvl1.png", Position(3, 4), "Maria", degraded), b"degraded")
+        assert game_map._cached_frame(("map-lvl1.png", Position(3, 4), "Maria", full)) is None  # noqa: SLF001
+
+
+class TestTravel(unittest.IsolatedAsyncioTestCase):
+    """Test class for the levels a player can travel to."""
+
+    async def test_only_unlocked_levels(self) -> None:
+        """Test that the levels a player hasn't unlocked, like the special levels, aren't listed."""
+        levels = [
+            types.SimpleNamespace(id=level, name=f"Level {level}", topic="Topic", map_position=(level, 0))
+            for level in range(1, 15)
+        ]
+        user = types.SimpleNamespace(name="maria", display_name="Maria", id=1)
+        player = Player("maria")
+        for level in (1, 2, 3):
+            player.complete_level(level, 100)
+        player.unlock_level(12)
+        with mock.patch.object(Controller, "levels", levels):
+            view = game_map.Map(user, player)
+        assert [option.value for option in view.travel.options] == ["1", "2", "3", "4", "12"]
+
+
+class TestNavigate(unittest.IsolatedAsyncioTestCase):
+    """Test class for showing the player's latest position, with a fake render and fake interactions."""
+
+    async def asyncSetUp(self) -> None:
+        """Create a map whose frames only finish rendering once released."""
+        self.started = []
+        self.release = asyncio.Event()
+
+        async def render(position: tuple[int, int], **_: object) -> types.SimpleNamespace:
+            self.started.append(position)
+            await self.release.wait()
+            return types.SimpleNamespace(filename="map.png", position=position)
+
+        for patcher in (
+            mock.patch.object(game_map, "map_to_discord_file", render),
+            mock.patch.object(game_map, "render_droppable", return_value=True),
+            mock.patch.object(game_map.prefetcher, "start", return_value=None),
+            mock.patch.object(game_map.AsyncPlayerRepo, "save", mock.AsyncMock()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.tiles = game_map.all_tiles()[:4]
+        user = types.SimpleNamespace(name="maria", display_name="Maria", id=1)
+        self.view = game_map.Map(user, Player("maria", coord=self.tiles[0]))
+
+    def interaction(self) -> mock.Mock:
+        """Return a fake interaction."""
+        return mock.Mock(response=mock.Mock(defer=mock.AsyncMock()), edit_original_response=mock.AsyncMock())
+
+    async def move(self, tile: tuple[int, int]) -> tuple[mock.Mock, asyncio.Task]:
+        """Move the player to the tile and start navigating, returning the interaction and the navigation."""
+        self.view.player.set_position(*tile)
+        interaction = self.interaction()
+        navigation = asyncio.create_task(self.view.navigate(interaction))
+        await asyncio.sleep(0)
+        return interaction, navigation
+
+    async def test_moves_are_coalesced(self) -> None:
+        """Test that moves made while a frame renders cancel it, and only the latest position is rendered and sent."""
+        first, navigation = await self.move(self.tiles[1])
+        await self.move(self.tiles[2])
+        last, _ = await self.move(self.tiles[3])
+        self.release.set()
+        await navigation
+
+        assert self.started == [self.tiles[1], self.tiles[3]]
+        first.edit_original_response.assert_not_called()
+        last.edit_original_response.assert_called_once()
+        assert last.edit_original_response.call_args.kwargs["attachments"][0].position == self.tiles[3]
+        assert self.view.shown_position == self.tiles[3]
+
+    async def test_navigation_is_cancelled(self) -> None:
+        """Test that cancelling the navigation stops it, even if the player moved on while the frame rendered."""
+        interaction, navigation = await self.move(self.tiles[1])
+        await asyncio.sleep(0.01)  # Until the frame is rendering
+        self.view.player.set_position(*self.tiles[2])
+        navigation.cancel()
+        with self.assertRaises(asyncio.CancelledError):  # noqa: PT027
+            async with asyncio.timeout(1):
+                await navigation
+
+        assert self.started == [self.tiles[1]]
+        interaction.edit_original_response.assert_not_called()
+        assert self.view.shown_position == self.tiles[0]
+
+
+class StubExecutor(Executor):
+    """Executor that runs nothing, and hands out futures that the test finishes instead."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[Callable, Future]] = []
+
+    def submit(self, function: Callable, /, *_: object, **__: object) -> Future:
+        """Record the call and return its unfinished future."""
+        future = Future()
+        self.calls.append((function, future))
+        return future
+
+    def finish(self, index: int) -> None:
+        """Finish the call at index with a fake frame."""
+        self.calls[index][1].set_result((b"frame", 0.0))
+
+    def keys(self) -> list[tuple[str, Position, str | None, game_map.FrameQuality]]:
+        """Return the keys of the frames that were handed to the executor."""
+        return [tuple(function.args[1:]) for function, _ in self.calls]
+
+
+class TestNeighbourPrefetcher(unittest.IsolatedAsyncioTestCase):
+    """Test class for prefetching the frames next to a player, with a stub render pool."""
+
+    async def asyncSetUp(self) -> None:
+        """Use a render pool that only hands calls to the stub executor."""
+        self.executor = StubExecutor()
+        patcher = mock.patch.object(game_map, "render_pool", BoundedExecutor(self.executor, "render", max_pending=4))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(game_map.frame_cache.clear)
+        self.player = Player("maria")
+        # A tile with at least three neighbours, so there is more to prefetch than the prefetcher renders at once
+        self.position = next(tile for tile in game_map.all_tiles() if len(game_map.grid.moves_from(*tile)) >= 3)  # noqa: PLR2004
+
+    async def asyncTearDown(self) -> None:
+        """Finish every call, so that no render outlives the test."""
+        while unfinished := [future for _, future in self.executor.calls if not future.done()]:
+            for future in unfinished:
+                future.set_result((b"frame", 0.0))
+            await asyncio.sleep(0.01)
+
+    async def test_concurrency_cap(self) -> None:
+        """Test that no more than max_concurrent prefetches render at once, and the next starts when one is done."""
+        game_map.NeighbourPrefetcher(2).start(self.position, player=self.player)
+        await asyncio.sleep(0.01)
+        assert len(self.executor.calls) == 2  # noqa: PLR2004
+        self.executor.finish(0)
+        await asyncio.sleep(0.01)
+        assert len(self.executor.calls) == 3  # noqa: PLR2004
+
+    async def test_skipped_when_pool_is_half_full(self) -> None:
+        """Test that nothing is prefetched while half of the render pool's slots are taken."""
+        busy = [asyncio.create_task(game_map.render_pool.run(print)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        skipped = counters["map prefetches skipped"]
+        await game_map.NeighbourPrefetcher(2).start(self.position, player=self.player)
+        assert len(self.executor.calls) == len(busy)
+        assert counters["map prefetches skipped"] - skipped == len(game_map.grid.moves_from(*self.position))
+
+    async def test_cancel_drops_renders_not_started(self) -> None:
+        """Test that cancelling a prefetch drops the renders it hasn't started, but lets a started render finish."""
+        prefetch = game_map.NeighbourPrefetcher(1).start(self.position, player=self.player)
+        await asyncio.sleep(0.01)
+        prefetch.cancel()
+        self.executor.finish(0)
+        await asyncio.sleep(0.01)
+        assert len(self.executor.calls) == 1
+        assert game_map.frame_cache.get(self.executor.keys()[0]) == b"frame"
+
+
+if __name__ == "__main__":
+    unittest.main()
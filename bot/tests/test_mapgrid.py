@@ -0,0 +1,71 @@
+import json
+import unittest
+from pathlib import Path
+
+from mapgrid import MapGrid, Move
+
+MAP_Z = {
+    "0": {"0": 0, "1": 0},
+    "1": {"1": -0.5},
+    "3": {"-1": -1},
+}
+
+
+def make_grid(map_z: dict) -> MapGrid:
+    """Compile a grid with the pixel geometry of the game map."""
+    return MapGrid(map_z, origin=(637, 1116.5), delta_x=(111.3, -52), delta_y=(111.3, 52), delta_z=(0, -105))
+
+
+class TestMapGrid(unittest.TestCase):
+    """Test class for the compiled map grid."""
+
+    def test_is_tile(self) -> None:
+        """Test that exactly the coordinates in map_z are tiles."""
+        grid = make_grid(MAP_Z)
+        assert grid.is_tile(1, 1)
+        assert grid.is_tile(3, -1)
+        assert not grid.is_tile(2, 0)  # Inside the grid, but not a tile
+        assert not grid.is_tile(4, 0)  # Outside the grid
+
+    def test_moves(self) -> None:
+        """Test that the moves lead to neighbouring tiles only."""
+        grid = make_grid(MAP_Z)
+        assert grid.moves_from(0, 1) == Move.UP | Move.RIGHT
+        assert grid.moves_from(3, -1) == Move(0)
+        assert grid.moves_from(10, 10) == Move(0)
+
+    def test_centres_match_map_geometry(self) -> None:
+        """Test the pixel centres against the formula for every tile of the real map."""
+        with Path.open(Path(__file__).parent.parent / "map_z.json") as f:
+            map_z = json.load(f)
+        grid = make_grid(map_z)
+        for x, column in map_z.items():
+            for y, z in column.items():
+                centre = grid.centre(int(x), int(y))
+                expected = (
+                    637 + int(x) * 111.3 + int(y) * 111.3 + z * 0,
+                    1116.5 + int(x) * -52 + int(y) * 52 + z * -105,
+                )
+                assert centre == expected
+
+    def test_centre_of_missing_tile(self) -> None:
+        """Test that asking for the centre of a square without a tile raises a KeyError."""
+        grid = make_grid(MAP_Z)
+        with self.assertRaises(KeyError):  # noqa: PT027
+            grid.centre(2, 0)
+
+    def test_shortest_path(self) -> None:
+        """Test that the path walks between neighbouring tiles in as few steps as possible."""
+        grid = make_grid(MAP_Z)
+        assert grid.shortest_path((1, 1), (0, 0)) == [(1, 1), (0, 1), (0, 0)]
+        assert grid.shortest_path((0, 0), (0, 0)) == [(0, 0)]
+
+    def test_shortest_path_unreachable(self) -> None:
+        """Test that there is no path to a tile that isn't connected, or to a square that isn't a tile."""
+        grid = make_grid(MAP_Z)
+        assert grid.shortest_path((0, 0), (3, -1)) is None
+        assert grid.shortest_path((0, 0), (2, 0)) is None
+
+
+if __name__ == "__main__":
+    unittest.main()
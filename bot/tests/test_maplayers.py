@@ -0,0 +1,33 @@
+import unittest
+from pathlib import Path
+
+from maplayers import MAX_THIN_SHARE, TOLERANCE, MapLayers
+from PIL import Image, ImageChops, ImageFilter
+
+path_maps = Path(__file__).parent.parent / "assets" / "map"
+
+
+def load(path: Path, mode: str = "RGBA") -> Image.Image:
+    """Return the image at path, converted to mode."""
+    with Image.open(path) as image:
+        return image.convert(mode)
+
+
+class TestCompose(unittest.TestCase):
+    """Test class for composing map variants from their layers."""
+
+    def test_reproduces_variants(self) -> None:
+        """Test that every composed variant matches its source within the tolerance documented in maplayers."""
+        layers = MapLayers(path_maps / "layers" / "layers.json")
+        base = load(path_maps / layers.base, "RGB")
+        for path in sorted(path_maps.glob("map-*.png")):
+            difference = ImageChops.difference(layers.compose(path.name, base, load), load(path, "RGB")).split()
+            difference = ImageChops.lighter(ImageChops.lighter(difference[0], difference[1]), difference[2])
+            beyond = difference.point(lambda value: 255 if value > TOLERANCE else 0)
+            thick = beyond.filter(ImageFilter.MinFilter(3)).filter(ImageFilter.MaxFilter(3))
+            assert thick.getbbox() is None, path.name
+            assert beyond.histogram()[255] <= MAX_THIN_SHARE * base.width * base.height, path.name
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from mappack import MapPack, bake
+from PIL import Image
+
+
+class TestBake(unittest.TestCase):
+    """Test class for baking frames into a pack."""
+
+    def test_bake_and_read(self) -> None:
+        """Test that baked frames are read back unchanged, from a pack in a directory that didn't exist."""
+        red, blue = Image.new("RGBA", (4, 3), (255, 0, 0, 255)), Image.new("RGBA", (4, 3), (0, 0, 255, 255))
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "assets" / "map.pack"
+            for format in ("png", "raw"):
+                frames = [("map-lvl1.png", (0, 0), red), ("map-lvl1.png", (1, 0), blue), ("map-lvl2.png", (0, 0), red)]
+                bake(path, frames, size=(4, 3), fingerprint="test", format=format)
+                assert [file.name for file in path.parent.iterdir()] == ["map.pack"]
+
+                pack = MapPack(path)
+                assert pack.get("map-lvl1.png", (1, 0)).tobytes() == blue.tobytes()
+                assert pack.locate("map-lvl1.png", (0, 0)) == pack.locate("map-lvl2.png", (0, 0))
+                assert pack.get("map-lvl2.png", (1, 0)) is None
+                pack.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from mappack import MapPack, bake
+from maptiles import assemble, covering_tiles, split
+from PIL import Image
+
+TILE_SIZE = 4
+
+
+def make_map() -> Image.Image:
+    """Create a 10x6 map where every pixel has its own color."""
+    image = Image.new("RGB", (10, 6))
+    image.putdata([(x, y, 255) for y in range(6) for x in range(10)])
+    return image
+
+
+class TestMapTiles(unittest.TestCase):
+    """Test class for cutting maps into tiles and assembling crops from them."""
+
+    def test_covering_tiles(self) -> None:
+        """Test that exactly the tiles overlapping the box are covered, also outside the map."""
+        assert covering_tiles((0, 0, 4, 4), TILE_SIZE) == [(0, 0)]
+        assert covering_tiles((3, 1, 5, 5), TILE_SIZE) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+        assert covering_tiles((-2, -2, 2, 2), TILE_SIZE) == [(-1, -1), (-1, 0), (0, -1), (0, 0)]
+
+    def test_assemble_matches_crop(self) -> None:
+        """Test that a crop assembled from tiles is identical to cropping the whole map."""
+        image = make_map()
+        tiles = dict(split(image, TILE_SIZE))
+        assert len(tiles) == 3 * 2
+        for box in [(0, 0, 10, 6), (1, 2, 7, 5), (-3, -1, 5, 4), (6, 3, 13, 9)]:
+            assembled = assemble(box, TILE_SIZE, tiles.get)
+            assert assembled.tobytes() == image.crop(box).tobytes()
+
+    def test_raw_tiles_are_views(self) -> None:
+        """Test that crops assembled from views of raw baked tiles match cropping the whole map."""
+        image = make_map()
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "map.tiles"
+            tiles = [(name, position, tile) for name in ["a", "b"] for position, tile in split(image, TILE_SIZE)]
+            bake(path, tiles, size=(TILE_SIZE, TILE_SIZE), fingerprint="", format="raw")
+            pack = MapPack(path)
+
+            def load_tile(tile: tuple[int, int]) -> Image.Image | None:
+                entry = pack.locate("b", tile)
+                return None if entry is None else pack.view(entry)
+
+            box = (-3, -1, 5, 4)
+            assert assemble(box, TILE_SIZE, load_tile).tobytes() == image.crop(box).tobytes()
+            pack.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
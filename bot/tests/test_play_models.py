@@ -105,6 +105,18 @@ class TestModel(unittest.TestCase):
         player = populate_db().get(username="noble")
         assert ("lvl2" in player.history) is True
 
+    def test_map_name(self) -> None:
+        """Test that the map variant follows the player's progress."""
+        player = populate_db().get(username="noble")
+        assert player.map_name == "map-lvl4.png"
+        player.complete_level(level=4, score=100)
+        assert player.map_name == "map-lvl5.png"
+        player.unlock_level(level=12)
+        player.unlock_level(level=13)
+        assert player.map_name == "map-lvl5-b.png"
+        player.complete_level(level=12, score=100)
+        assert player.map_name == "map-lvl5-ab.png"
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from unittest import mock
+
+from utils.quality import FrameQuality, QualityController
+
+LEVELS = [
+    FrameQuality(scale=1, compress_level=6, quality=80),
+    FrameQuality(scale=0.8, compress_level=1, quality=60),
+    FrameQuality(scale=0.6, compress_level=1, quality=40),
+]
+
+
+def make_controller() -> QualityController:
+    """Create a controller that downgrades above 4 pending renders or a p95 of 1 second."""
+    return QualityController(LEVELS, name="test quality", max_pending=4, max_p95=1, interval=5)
+
+
+class TestQualityController(unittest.TestCase):
+    """Test class for the frame quality controller."""
+
+    @mock.patch("utils.quality.monotonic")
+    def test_downgrades_one_level_per_interval(self, monotonic: mock.Mock) -> None:
+        """Test that quality drops a level at a time while too many renders are pending."""
+        controller = make_controller()
+        monotonic.return_value = 100
+        assert controller.current(pending=0) == LEVELS[0]
+        assert controller.current(pending=10) == LEVELS[1]
+        assert controller.current(pending=10) == LEVELS[1]  # Too soon after the last change
+        monotonic.return_value = 105
+        assert controller.current(pending=10) == LEVELS[2]
+        monotonic.return_value = 110
+        assert controller.current(pending=10) == LEVELS[2]  # Already the lowest quality
+
+    @mock.patch("utils.quality.monotonic")
+    def test_downgrades_on_slow_renders(self, monotonic: mock.Mock) -> None:
+        """Test that quality drops when renders are slow, even if few are pending."""
+        controller = make_controller()
+        monotonic.return_value = 100
+        for _ in range(10):
+            controller.record(2)
+        assert controller.current(pending=0) == LEVELS[1]
+
+    @mock.patch("utils.quality.monotonic")
+    def test_recovers_when_load_drops(self, monotonic: mock.Mock) -> None:
+        """Test that quality comes back once the load is well below the thresholds."""
+        controller = make_controller()
+        monotonic.return_value = 100
+        controller.current(pending=10)
+        monotonic.return_value = 105
+        assert controller.current(pending=3) == LEVELS[1]  # Below the threshold, but not below half of it
+        controller.record(0.1)
+        assert controller.current(pending=2) == LEVELS[0]
+
+
+if __name__ == "__main__":
+    unittest.main()
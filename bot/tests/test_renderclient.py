@@ -0,0 +1,60 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from renderclient import ERROR, OK, RenderClient, RenderError, read_message, write_message
+from utils.quality import FrameQuality
+
+QUALITY = FrameQuality(scale=1, compress_level=6, quality=80)
+
+
+class TestRenderClient(unittest.IsolatedAsyncioTestCase):
+    """Test class for the render server client, against a fake server."""
+
+    async def asyncSetUp(self) -> None:
+        """Start a fake server that answers with the request, fails for an empty name, and hangs for "slow"."""
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            request = await read_message(reader)
+            name = json.loads(request)["player_display_name"]
+            if name == "slow":
+                await asyncio.sleep(1)
+            write_message(writer, OK + request if name else ERROR + b"no name")
+            await writer.drain()
+            writer.close()
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "render.sock"
+        self.server = await asyncio.start_unix_server(handle, self.path)
+
+    async def asyncTearDown(self) -> None:
+        """Stop the fake server."""
+        self.server.close()
+        await self.server.wait_closed()
+        self.directory.cleanup()
+
+    async def test_render(self) -> None:
+        """Test that the request holds the frame's arguments and the frame is returned."""
+        frame = await RenderClient(self.path, timeout=1).render("map-done.png", (2, 0), "Maria", QUALITY)
+        assert json.loads(frame) == {
+            "map_name": "map-done.png",
+            "position": [2, 0],
+            "player_display_name": "Maria",
+            "quality": [1, 6, 80],
+        }
+
+    async def test_error(self) -> None:
+        """Test that a failed render raises a RenderError with the server's message."""
+        with self.assertRaisesRegex(RenderError, "no name"):  # noqa: PT027
+            await RenderClient(self.path, timeout=1).render("map-done.png", (2, 0), "", QUALITY)
+
+    async def test_timeout(self) -> None:
+        """Test that a server that doesn't answer in time raises a TimeoutError."""
+        with self.assertRaises(TimeoutError):  # noqa: PT027
+            await RenderClient(self.path, timeout=0.1).render("map-done.png", (2, 0), "slow", QUALITY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import map as game_map
+import renderserver
+from database.models.player import Position
+from renderclient import HEADER, RenderClient, RenderError
+from utils.quality import FrameQuality
+
+QUALITY = FrameQuality(scale=1, compress_level=6, quality=80)
+
+
+class TestRenderServer(unittest.IsolatedAsyncioTestCase):
+    """Test class for the render server, with a fake render."""
+
+    async def asyncSetUp(self) -> None:
+        """Start the server on a socket in a temporary directory, rendering the key of every frame as the frame."""
+        self.keys = []
+
+        async def render_cached(key: tuple[str, Position, str | None, FrameQuality]) -> bytes:
+            self.keys.append(key)
+            return repr(key).encode()
+
+        patcher = mock.patch.object(game_map, "render_cached", render_cached)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "render.sock"
+        self.server = await asyncio.start_unix_server(renderserver.handle, self.path)
+        self.client = RenderClient(self.path, timeout=1)
+
+    async def asyncTearDown(self) -> None:
+        """Stop the server."""
+        self.server.close()
+        await self.server.wait_closed()
+        self.directory.cleanup()
+
+    async def test_render(self) -> None:
+        """Test that the frame is rendered with the key in the request."""
+        key = ("map-done.png", Position(2, 0), "Maria", QUALITY)
+        assert await self.client.render(*key) == repr(key).encode()
+        assert self.keys == [key]
+
+    async def test_unknown_map_variant(self) -> None:
+        """Test that a request for a map variant that doesn't exist, like a path out of the map folder, fails."""
+        for map_name in ("map-lvl12.png", "../../config.py"):
+            with self.assertRaisesRegex(RenderError, "Unknown map variant"):  # noqa: PT027
+                await self.client.render(map_name, (2, 0), "Maria", QUALITY)
+        assert self.keys == []
+
+    async def test_client_goes_away(self) -> None:
+        """Test that a client closing the connection before the frame is sent doesn't fail the handler."""
+        reader = asyncio.StreamReader()
+        request = json.dumps(
+            {"map_name": "map-done.png", "position": [2, 0], "player_display_name": "Maria", "quality": QUALITY},
+        ).encode()
+        reader.feed_data(HEADER.pack(len(request)) + request)
+        writer = mock.Mock(drain=mock.AsyncMock(side_effect=BrokenPipeError))
+        await renderserver.handle(reader, writer)
+        writer.close.assert_called_once()
+
+    async def test_socket_in_use(self) -> None:
+        """Test that a second server doesn't take over the socket of a running one."""
+        with self.assertRaises(RuntimeError):  # noqa: PT027
+            await renderserver.serve(self.path)
+        assert await self.client.render("map-done.png", (2, 0), "Maria", QUALITY)
+
+
+if __name__ == "__main__":
+    unittest.main()
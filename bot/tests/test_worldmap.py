@@ -0,0 +1,42 @@
+import random
+import unittest
+
+from PIL import Image
+from worldmap import WorldMap, group_players
+
+
+def make_world_map() -> WorldMap:
+    """Create a world map of 10x10 tiles of 8x8 pixels, with labels as wide as their text."""
+    base = Image.new("RGB", (80, 80))
+    base.putdata([(x, y, 0) for y in range(80) for x in range(80)])
+    sprite = Image.new("RGBA", (10, 12), (255, 0, 0, 128))
+
+    def label(text: str) -> Image.Image:
+        return Image.new("RGBA", (len(text) * 2, 4), (0, len(text) * 10, 255, 255))
+
+    return WorldMap(base, sprite, lambda tile: (tile[0] * 8 + 4, tile[1] * 8 + 8), label)
+
+
+class TestWorldMap(unittest.TestCase):
+    """Test class for the world map."""
+
+    def test_group_players(self) -> None:
+        """Test that players on the same tile share one label, named after the first of them."""
+        groups = group_players({"maria": (1, 0), "bob": (1, 0), "alice": (2, 2)})
+        assert groups == {(1, 0): "bob +1", (2, 2): "alice"}
+
+    def test_redrawing_changes_matches_full_render(self) -> None:
+        """Test that a frame updated one move at a time is identical to a frame drawn from scratch."""
+        rng = random.Random(0)  # noqa: S311, not used for security
+        tiles = [(x, y) for x in range(10) for y in range(10)]
+        positions = {f"player{i}": rng.choice(tiles) for i in range(30)}
+        world_map = make_world_map()
+        world_map.render(positions)
+        for _ in range(20):
+            positions[rng.choice(list(positions))] = rng.choice(tiles)
+            frame = world_map.render(positions)
+            assert frame.tobytes() == make_world_map().render(positions).tobytes()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from threading import Lock
+from time import monotonic
+from typing import Generic, NamedTuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class CacheStats(NamedTuple):
+    """Snapshot of the counters of a cache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    entries: int
+    size: int
+    max_size: int
+
+    @property
+    def hit_rate(self) -> float:
+        """Return the share of lookups that were served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache(Generic[K, V]):
+    """Least recently used cache, bounded by the total size of its values.
+
+    The size of a value is measured with `sizeof`, which counts every value as 1 by default.
+    When a new value does not fit, the least recently used values are evicted until it does.
+    A value larger than the whole cache is returned to the caller but never stored.
+    If `ttl` is given, values expire that many seconds after they were stored, or, with `sliding`, after they were
+    last stored or read, so only values that sit unused expire.
+
+    The cache is safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        sizeof: Callable[[V], int] = lambda _: 1,
+        ttl: float | None = None,
+        *,
+        sliding: bool = False,
+    ) -> None:
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.sliding = sliding
+        self._entries: OrderedDict[K, tuple[V, int, float]] = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        """Return the cached value for key, or default if it isn't cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= monotonic():
+                self._size -= self._entries.pop(key)[1]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            if self.sliding and self.ttl is not None:
+                self._entries[key] = (entry[0], entry[1], monotonic() + self.ttl)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        """Store value under key, evicting the least recently used values if needed."""
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            if size > self.max_size:
+                return
+            while self._size + size > self.max_size:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+            expires = monotonic() + self.ttl if self.ttl is not None else float("inf")
+            self._entries[key] = (value, size, expires)
+            self._size += size
+
+    def get_or_load(self, key: K, load: Callable[[], V]) -> V:
+        """Return the cached value for key, calling load and caching the result on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = load()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        """Remove all values from the cache. The counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the cache counters."""
+        return CacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            expirations=self.expirations,
+            entries=len(self._entries),
+            size=self._size,
+            max_size=self.max_size,
+        )
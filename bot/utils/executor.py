@@ -0,0 +1,74 @@
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import Executor
+from functools import partial
+from time import perf_counter
+from typing import Any, TypeVar
+
+from utils.metrics import timings
+
+T = TypeVar("T")
+
+
+def _timed(function: Callable[..., T], *args: Any, **kwargs: Any) -> tuple[T, float]:  # noqa: ANN401
+    """Call the function and return its result together with how long it took.
+
+    This runs inside the worker, so the duration doesn't include time spent waiting for a free worker.
+    """
+    start = perf_counter()
+    result = function(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+class BoundedExecutor:
+    """Runs blocking functions in an executor without blocking the event loop.
+
+    At most `max_pending` calls are handed to the executor at once. Further calls wait on the event loop
+    until a slot is free, so a burst of work can't pile up an unbounded backlog inside the executor.
+
+    The time each call spends waiting and running is recorded in the `"<name> wait"` and `"<name>"` timings.
+    When using a process pool, the function and its arguments must be picklable.
+    """
+
+    def __init__(self, executor: Executor, name: str, max_pending: int) -> None:
+        self.executor = executor
+        self.name = name
+        self.max_pending = max_pending
+        self.pending = 0  # Calls that are waiting for a slot or running
+        self._slots: asyncio.Semaphore | None = None
+        self._handed_over: set[asyncio.Task] = set()  # Tasks whose call has a slot
+
+    async def run(self, function: Callable[..., T], *args: Any, **kwargs: Any) -> T:  # noqa: ANN401
+        """Run the function in the executor and return its result."""
+        if self._slots is None:
+            # Created lazily, so that the semaphore is bound to the running event loop
+            self._slots = asyncio.Semaphore(self.max_pending)
+        self.pending += 1
+        start = perf_counter()
+        try:
+            async with self._slots:
+                task = asyncio.current_task()
+                self._handed_over.add(task)
+                try:
+                    loop = asyncio.get_running_loop()
+                    call = partial(_timed, function, *args, **kwargs)
+                    result, elapsed = await loop.run_in_executor(self.executor, call)
+                finally:
+                    self._handed_over.discard(task)
+        finally:
+            self.pending -= 1
+        timings[self.name].record(elapsed)
+        timings[f"{self.name} wait"].record(perf_counter() - start - elapsed)
+        return result
+
+    def handed_over(self, task: asyncio.Task) -> bool:
+        """Return whether the call the task is making has a slot, so it may already run in the executor.
+
+        Cancelling a task that is still waiting for a slot drops its call, while a call that was handed over keeps
+        running in the executor.
+        """
+        return task in self._handed_over
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        """Shut down the executor."""
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,38 @@
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class Timings:
+    """Durations of the most recent runs of an operation, in seconds."""
+
+    def __init__(self, window: int = 1000) -> None:
+        self.samples: deque[float] = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        """Record the duration of one run."""
+        self.samples.append(seconds)
+        self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Record how long the body of the with statement takes to run."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(perf_counter() - start)
+
+    def percentile(self, percent: float) -> float:
+        """Return the given percentile of the recorded durations, or 0 if nothing has been recorded."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+# Process-wide metrics, keyed by the name of what is measured
+timings: defaultdict[str, Timings] = defaultdict(Timings)
+counters: Counter[str] = Counter()
@@ -0,0 +1,66 @@
+import math
+from time import monotonic
+from typing import NamedTuple
+
+from utils.metrics import Timings, counters
+
+
+class FrameQuality(NamedTuple):
+    """Settings a frame is rendered in."""
+
+    scale: float  # Fraction of the full width and height of the frame
+    compress_level: int  # zlib level of PNG frames
+    quality: int  # Quality of lossy frames, or compression effort of lossless WebP
+
+
+class QualityController:
+    """Picks the quality to render frames in, lowering it while the renderer is overloaded.
+
+    Load is measured by the number of pending renders and the 95th percentile latency of the most recent renders.
+    When either crosses its threshold, quality drops one level, and it rises one level again once both are below
+    half of their threshold. Quality changes at most once every interval seconds, and latencies are only compared
+    to the threshold if they were measured at the current level, so every change has time to take effect.
+
+    Every downgrade is counted in the `"<name> downgrades"` counter.
+    """
+
+    def __init__(
+        self,
+        levels: list[FrameQuality],
+        *,
+        name: str,
+        max_pending: int,
+        max_p95: float,
+        interval: float = 5,
+        window: int = 50,
+    ) -> None:
+        self.levels = levels
+        self.name = name
+        self.max_pending = max_pending
+        self.max_p95 = max_p95
+        self.interval = interval
+        self.window = window
+        self.level = 0  # Index in levels, 0 is full quality
+        self.latency = Timings(window)
+        self._changed_at = -math.inf
+
+    def record(self, seconds: float) -> None:
+        """Record the latency of a render, from the request to the encoded frame."""
+        self.latency.record(seconds)
+
+    def current(self, pending: int) -> FrameQuality:
+        """Return the quality to render the next frame in, given the number of renders that are pending."""
+        now = monotonic()
+        if now - self._changed_at >= self.interval:
+            p95 = self.latency.percentile(95)
+            if (pending > self.max_pending or p95 > self.max_p95) and self.level < len(self.levels) - 1:
+                self._change(self.level + 1, now)
+                counters[f"{self.name} downgrades"] += 1
+            elif pending <= self.max_pending // 2 and p95 <= self.max_p95 / 2 and self.level > 0:
+                self._change(self.level - 1, now)
+        return self.levels[self.level]
+
+    def _change(self, level: int, now: float) -> None:
+        self.level = level
+        self._changed_at = now
+        self.latency = Timings(self.window)
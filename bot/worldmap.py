@@ -0,0 +1,107 @@
+"""Overview of where every player is, drawn on one image of the whole map.
+
+Players on the same tile are batched into a single sprite with a single label, like "maria +3", so the cost of
+a render depends on the number of occupied tiles rather than the number of players. The last frame is kept, and
+a new render only redraws the regions of the tiles whose group of players changed since.
+"""
+
+import threading
+from collections.abc import Callable, Mapping
+
+from PIL import Image
+
+Tile = tuple[int, int]
+Box = tuple[int, int, int, int]
+
+
+def group_players(positions: Mapping[str, Tile]) -> dict[Tile, str]:
+    """Return the label of every occupied tile, naming the first player on it and counting the rest."""
+    players: dict[Tile, list[str]] = {}
+    for username, tile in positions.items():
+        players.setdefault(tuple(tile), []).append(username)
+    labels = {}
+    for tile, usernames in players.items():
+        first, *others = sorted(usernames)
+        labels[tile] = f"{first} +{len(others)}" if others else first
+    return labels
+
+
+def _overlaps(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class WorldMap:
+    """Renders the players onto a base image of the map, redrawing only what changed between renders.
+
+    anchor returns the pixel on the base image that a sprite on the tile stands on, and label returns the image
+    of a label text. Both are called for every tile that is drawn, so label should be cached by the caller.
+    Tiles are drawn from the back to the front of the map, so sprites further down overlap those above them.
+    """
+
+    # Pixels between the top of a sprite and the bottom of its label
+    LABEL_GAP = 2
+
+    def __init__(
+        self,
+        base: Image.Image,
+        sprite: Image.Image,
+        anchor: Callable[[Tile], tuple[float, float]],
+        label: Callable[[str], Image.Image],
+    ) -> None:
+        self.base = base.convert("RGB")
+        self.sprite = sprite
+        self.anchor = anchor
+        self.label = label
+        self.frame = self.base.copy()
+        self.groups: dict[Tile, str] = {}  # Label of every tile drawn on the frame
+        self.regions: dict[Tile, Box] = {}  # Box covering the sprite and label of every tile drawn on the frame
+        self._lock = threading.Lock()
+
+    def render(self, positions: Mapping[str, Tile]) -> Image.Image:
+        """Draw the players at their positions and return a copy of the frame."""
+        with self._lock:
+            groups = group_players(positions)
+            tiles = groups.keys() | self.groups.keys()
+            changed = {tile for tile in tiles if groups.get(tile) != self.groups.get(tile)}
+            regions = {tile: self._region(tile, label) for tile, label in groups.items()}
+            dirty = [self.regions[tile] for tile in changed if tile in self.regions]
+            dirty += [regions[tile] for tile in changed if tile in regions]
+            self.groups, self.regions = groups, regions
+            if len(changed) > len(groups) // 2:
+                self.frame = self._draw((0, 0, *self.base.size))
+            else:
+                for box in dirty:
+                    self.frame.paste(self._draw(box), box[:2])
+            return self.frame.copy()
+
+    def _place(self, tile: Tile, label: Image.Image) -> tuple[tuple[int, int], tuple[int, int]]:
+        """Return the top left corners of the sprite and the label of the tile on the frame."""
+        anchor_x, anchor_y = self.anchor(tile)
+        sprite_x = round(anchor_x - self.sprite.width / 2)
+        sprite_y = round(anchor_y) - self.sprite.height
+        label_x = round(anchor_x - label.width / 2)
+        label_y = sprite_y - self.LABEL_GAP - label.height
+        return (sprite_x, sprite_y), (label_x, label_y)
+
+    def _region(self, tile: Tile, label: str) -> Box:
+        """Return the box on the frame that the sprite and label of the tile cover."""
+        label_image = self.label(label)
+        (sprite_x, sprite_y), (label_x, label_y) = self._place(tile, label_image)
+        return (
+            min(sprite_x, label_x),
+            label_y,
+            max(sprite_x + self.sprite.width, label_x + label_image.width),
+            sprite_y + self.sprite.height,
+        )
+
+    def _draw(self, box: Box) -> Image.Image:
+        """Return the box of the base image with every group that overlaps it drawn on top."""
+        canvas = self.base.crop(box)
+        for tile in sorted(self.groups, key=lambda tile: self.anchor(tile)[::-1]):
+            if not _overlaps(self.regions[tile], box):
+                continue
+            label = self.label(self.groups[tile])
+            (sprite_x, sprite_y), (label_x, label_y) = self._place(tile, label)
+            canvas.paste(self.sprite, (sprite_x - box[0], sprite_y - box[1]), self.sprite)
+            canvas.paste(label, (label_x - box[0], label_y - box[1]), label)
+        return canvas